@@ -0,0 +1,138 @@
+import os
+
+import metrics
+from ocr_backend import OCR_LANG, image_to_data
+from ocr_engine import join_pages, pdf_source, plan_pages, render_pages, triage_pages
+from preprocess import preprocess_image
+from roi_ocr import ROI_PSM, anchor_regions, data_lines, merge_regions
+
+# OCR thích nghi theo độ tin cậy: lượt đầu OCR cả trang ở DPI thấp bằng
+# image_to_data (nhanh, đủ cho bản scan sạch), sau đó chỉ OCR lại ở DPI cao các
+# dải quanh nhãn (xem roi_ocr.ROI_ANCHORS) mà:
+#   - trường cần thiết không trích xuất được (missing_fields), hoặc
+#   - có dòng đọc với độ tin cậy dưới ADAPTIVE_MIN_CONF.
+# Mỗi dải thử lần lượt các chế độ phân trang ADAPTIVE_RETRY_PSMS, dừng ở kết quả
+# đầu tiên được nhận; kết quả OCR lại chỉ được thay vào khi trích xuất được nhiều
+# trường hơn, hoặc cùng số trường nhưng độ tin cậy cao hơn. Trường thiếu mà không
+# tìm thấy nhãn trên trang nào thì chỉ OCR lại cả trang ở DPI cao với những trang
+# có độ tin cậy trung bình thấp (nhãn có thể bị đọc sai), một chế độ phân trang.
+# Chỉ OCR lại một lượt, không lặp lại.
+ADAPTIVE_DPI = int(os.environ.get("OCR_ADAPTIVE_DPI", 150))
+ADAPTIVE_RETRY_DPI = int(os.environ.get("OCR_ADAPTIVE_RETRY_DPI", 300))
+ADAPTIVE_MIN_CONF = float(os.environ.get("OCR_ADAPTIVE_MIN_CONF", 70))
+ADAPTIVE_RETRY_PSMS = (ROI_PSM, 4)  # một khối văn bản, rồi một cột nhiều cỡ chữ
+ADAPTIVE_PAGE_PSMS = (None,)        # cả trang: tự phân trang như lượt đầu
+
+# Trường bắt buộc (land_info.REQUIRED_FIELDS) -> nhóm vùng chứa nhãn của trường
+FIELD_REGIONS = {
+    "Chủ sở hữu": "nguoi_su_dung",
+    "Thửa": "thua_dat",
+    "Tờ": "thua_dat",
+    "Diện tích": "thua_dat",
+    "Số phát hành": "chi_nhanh",
+}
+
+
+def _mean_conf(lines):
+    return sum(line[5] for line in lines) / len(lines) if lines else 0.0
+
+
+def _page_text(lines):
+    return "\n".join(line[0] for line in lines)
+
+
+def _in_band(line, top, bottom):
+    return top <= (line[2] + line[4]) / 2 <= bottom
+
+
+# Render và tiền xử lý một trang ảnh ở `dpi`
+def _render(source, page_index, dpi):
+    rendered = render_pages(source, page_index, page_index, dpi)[0]
+    with metrics.stage("preprocess", pages=1):
+        img = preprocess_image(rendered, dpi)
+    if img is not rendered:
+        rendered.close()
+    return img
+
+
+# Thay các dòng nằm trong dải (top, bottom) bằng các dòng OCR lại, giữ thứ tự đọc
+def _replace_band(lines, top, bottom, new_lines):
+    inside = [_in_band(line, top, bottom) for line in lines]
+    position = inside.index(True) if any(inside) else sum(1 for line in lines if line[2] < top)
+    kept = [line for line, flag in zip(lines, inside) if not flag]
+    return kept[:position] + new_lines + kept[position:]
+
+
+# Các dải cần OCR lại của từng trang: {số trang: ([(top, bottom), ...], các chế độ phân trang)}
+def retry_regions(scanned, missing):
+    groups = {FIELD_REGIONS[field] for field in missing if field in FIELD_REGIONS}
+    found = set()
+    plan = {}
+    for index, state in scanned.items():
+        lines = sorted(state["lines"], key=lambda line: line[2])
+        regions = []
+        for group, top, bottom in anchor_regions(lines, state["height"]):
+            found.add(group)
+            band = [line for line in lines if _in_band(line, top, bottom)]
+            if group in groups or min((line[5] for line in band), default=0) < ADAPTIVE_MIN_CONF:
+                regions.append((top, bottom))
+        if regions:
+            plan[index] = (merge_regions(regions), ADAPTIVE_RETRY_PSMS)
+    if groups - found:
+        for index, state in scanned.items():
+            if _mean_conf(state["lines"]) < ADAPTIVE_MIN_CONF:
+                plan[index] = ([(0, state["height"])], ADAPTIVE_PAGE_PSMS)
+    return plan
+
+
+# OCR lại các dải của một trang ở ADAPTIVE_RETRY_DPI; trả về danh sách trường còn thiếu
+def _retry_page(source, pages, page_index, regions, psms, state, missing, missing_fields, lang):
+    img = _render(source, page_index, ADAPTIVE_RETRY_DPI)
+    scale = img.height / state["height"]
+    for top, bottom in regions:
+        crop = img.crop((0, int(top * scale), img.width, min(img.height, int(bottom * scale))))
+        for psm in psms:
+            with metrics.stage("ocr_retry"):
+                data = image_to_data(crop, lang, psm)
+            # Đổi toạ độ về ảnh của lượt đầu
+            new_lines = [(text, l / scale, top + t / scale, r / scale, top + b / scale, conf)
+                         for text, l, t, r, b, conf in data_lines(data)]
+            old_lines = [line for line in state["lines"] if _in_band(line, top, bottom)]
+            candidate = _replace_band(state["lines"], top, bottom, new_lines)
+            pages[page_index]["text"] = _page_text(candidate)
+            candidate_missing = missing_fields(join_pages(pages))
+            if len(candidate_missing) < len(missing) or (
+                    len(candidate_missing) == len(missing) and _mean_conf(new_lines) > _mean_conf(old_lines)):
+                state["lines"], missing = candidate, candidate_missing
+                break
+            else:
+                pages[page_index]["text"] = _page_text(state["lines"])
+        crop.close()
+    img.close()
+    return missing
+
+
+# Trích xuất text thích nghi: `missing_fields(text)` trả về danh sách trường bắt
+# buộc chưa trích xuất được từ text (xem land_info.missing_land_fields)
+def extract_adaptive_text(pdf, missing_fields=None, lang=OCR_LANG):
+    source = pdf_source(pdf)
+    pages = plan_pages(source)
+    metrics.set_pages(len(pages))
+    triage_pages(source, pages, lang)
+    scanned = {}
+    for page in pages:
+        if page["text"] is None:
+            img = _render(source, page["page"], ADAPTIVE_DPI)
+            with metrics.stage("ocr", pages=1):
+                lines = data_lines(image_to_data(img, lang))
+            scanned[page["page"]] = {"lines": lines, "height": img.height}
+            page["text"] = _page_text(lines)
+            img.close()
+    if missing_fields is None or not scanned:
+        return join_pages(pages)
+
+    missing = missing_fields(join_pages(pages))
+    for page_index, (regions, psms) in retry_regions(scanned, missing).items():
+        missing = _retry_page(source, pages, page_index, regions, psms, scanned[page_index], missing,
+                              missing_fields, lang)
+    return join_pages(pages)
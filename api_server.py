@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import metrics
+from land_info import OCR_MODES, extract_land_info, extract_land_info_for_excel, extract_texts_from_scanned_pdfs
+from ocr_backend import active_backend
+from ocr_cache import content_hash
+from ocr_engine import OCR_WORKERS, get_ocr_pool, open_pdf
+from parcel_store import save_result
+
+# API HTTP cục bộ cho các hệ thống khác (chỉ dùng thư viện chuẩn, chạy offline),
+# dùng chung pipeline với các app: extract_text_from_scanned_pdf -> extract_land_info.
+#
+#   python api_server.py --port 8502
+#   curl --data-binary @gcn.pdf "http://127.0.0.1:8502/extract?name=gcn.pdf&mode=full"
+#
+#   POST /extract   body là nội dung file PDF; tham số: name (tên file), mode
+#                   (full | roi | adaptive), text=1 để trả về cả text OCR
+#   GET  /healthz   trạng thái dịch vụ
+#   GET  /metrics   bộ đếm Prometheus (metrics.py)
+#
+# Số request xử lý đồng thời bị giới hạn bởi API_MAX_REQUESTS; request chờ quá
+# API_QUEUE_SECONDS nhận 503 kèm Retry-After. Các request đến gần nhau (trong
+# API_BATCH_SECONDS, tối đa API_BATCH_MAX file) được gom thành một lô để các
+# trang của mọi file trong lô cùng chia cho pool OCR dùng chung (xem
+# extract_documents), thay vì mỗi request chiếm một tiến trình OCR.
+API_HOST = os.environ.get("OCR_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("OCR_API_PORT", 8502))
+API_MAX_REQUESTS = int(os.environ.get("OCR_API_MAX_REQUESTS", OCR_WORKERS * 2))
+API_QUEUE_SECONDS = float(os.environ.get("OCR_API_QUEUE_SECONDS", 30))
+API_BATCH_SECONDS = float(os.environ.get("OCR_API_BATCH_MS", 50)) / 1000
+API_BATCH_MAX = int(os.environ.get("OCR_API_BATCH_MAX", 16))
+API_MAX_BYTES = int(os.environ.get("OCR_API_MAX_MB", 50)) * 1024 * 1024
+# Số lô chạy cùng lúc: lô sau được chia trang cho pool ngay khi lô trước còn vài trang cuối
+API_BATCHES = 2
+
+_slots = threading.BoundedSemaphore(API_MAX_REQUESTS)
+_cond = threading.Condition()
+_pending = []
+_active = 0
+_batcher = None
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# OCR một lô file cùng chế độ; lô lỗi (ví dụ một file hỏng) thì chạy lại từng file
+# để lỗi chỉ trả về cho đúng request đó
+def _run_batch(items):
+    try:
+        texts = extract_texts_from_scanned_pdfs([item["pdf"] for item in items], items[0]["mode"],
+                                                records=[item["record"] for item in items])
+    except Exception as e:
+        if len(items) == 1:
+            items[0]["future"].set_exception(e)
+            return
+        for item in items:
+            _run_batch([item])
+        return
+    for item, text in zip(items, texts):
+        item["future"].set_result(text)
+
+
+# Luồng gom request: chờ thêm tối đa API_BATCH_SECONDS sau request đầu tiên rồi
+# gửi cả lô (chia theo chế độ OCR) sang luồng chạy lô
+def _batch_loop(executor):
+    while True:
+        with _cond:
+            while not _pending:
+                _cond.wait()
+            deadline = time.monotonic() + API_BATCH_SECONDS
+            while len(_pending) < API_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _cond.wait(remaining)
+            batch = _pending[:API_BATCH_MAX]
+            del _pending[:API_BATCH_MAX]
+        for mode in dict.fromkeys(item["mode"] for item in batch):
+            executor.submit(_run_batch, [item for item in batch if item["mode"] == mode])
+
+
+def start_batcher():
+    global _batcher
+    with _cond:
+        if _batcher is None:
+            executor = ThreadPoolExecutor(max_workers=API_BATCHES, thread_name_prefix="ocr-batch")
+            _batcher = threading.Thread(target=_batch_loop, args=(executor,), name="ocr-batcher", daemon=True)
+            _batcher.start()
+
+
+# Đưa một file vào lô kế tiếp, chờ text OCR
+def ocr_text(pdf, mode, record):
+    item = {"pdf": pdf, "mode": mode, "record": record, "future": Future()}
+    with _cond:
+        _pending.append(item)
+        _cond.notify()
+    return item["future"].result()
+
+
+# Toàn bộ xử lý một request /extract; trả về dict kết quả (JSON)
+def extract(pdf, name, mode="full", with_text=False):
+    if mode not in OCR_MODES:
+        raise RequestError(400, f"mode phải là một trong {', '.join(OCR_MODES)}")
+    if not pdf.startswith(b"%PDF"):
+        raise RequestError(400, "Nội dung gửi lên không phải file PDF")
+    try:
+        with open_pdf(pdf) as doc:
+            if doc.page_count == 0:
+                raise RequestError(400, "File PDF không có trang nào")
+    except RuntimeError as e:  # PyMuPDF không mở được file hỏng
+        raise RequestError(400, f"Không đọc được file PDF: {e}")
+
+    record = metrics.new_document(name)
+    text = ocr_text(pdf, mode, record)
+    with metrics.active(record):
+        row = extract_land_info_for_excel(text)
+        land_info, nguoi_su_dung = extract_land_info(text)
+    summary = metrics.finish_document(record)
+    metrics.publish(summary)
+    save_result(name, text, land_info, nguoi_su_dung, row, content_hash(pdf))
+    result = {"file": name, "row": {**row, "Tên file": name}, "land_info": land_info,
+              "nguoi_su_dung": nguoi_su_dung, "metrics": summary}
+    if with_text:
+        result["text"] = text
+    return result
+
+
+def health():
+    with _cond:
+        queued = len(_pending)
+    return {
+        "status": "ok", "backend": active_backend(), "workers": OCR_WORKERS,
+        "active_requests": _active, "max_requests": API_MAX_REQUESTS, "queued_files": queued,
+    }
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "OcrLandInfo/1.0"
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/healthz":
+            self._send(200, health())
+        elif path == "/metrics":
+            self._send(200, metrics.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/extract":
+            self._send(405, {"error": "Dùng POST để gửi file PDF"}, headers={"Allow": "POST"})
+        else:
+            self._send(404, {"error": "Không tìm thấy"})
+
+    def do_POST(self):
+        global _active
+        url = urlparse(self.path)
+        if url.path != "/extract":
+            self._send(404, {"error": "Không tìm thấy"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send(400, {"error": "Thiếu nội dung file PDF"})
+            return
+        if length > API_MAX_BYTES:
+            self._send(413, {"error": f"File lớn hơn {API_MAX_BYTES // (1024 * 1024)} MB"})
+            return
+        # Giới hạn số request đang xử lý trước khi đọc nội dung file vào bộ nhớ
+        if not _slots.acquire(timeout=API_QUEUE_SECONDS):
+            self._send(503, {"error": "Dịch vụ đang bận, vui lòng thử lại sau"},
+                       headers={"Retry-After": str(max(1, int(API_QUEUE_SECONDS)))})
+            return
+        with _cond:
+            _active += 1
+        try:
+            pdf = self.rfile.read(length)
+            query = parse_qs(url.query)
+            name = query.get("name", ["upload.pdf"])[0]
+            mode = query.get("mode", ["full"])[0]
+            with_text = query.get("text", ["0"])[0] == "1"
+            self._send(200, extract(pdf, name, mode, with_text))
+        except RequestError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            with _cond:
+                _active -= 1
+            _slots.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP trích xuất thông tin thửa đất từ file PDF")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+
+    get_ocr_pool()  # khởi động pool OCR trước request đầu tiên
+    start_batcher()
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    print(f"Đang phục vụ tại http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
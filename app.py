@@ -1,108 +1,253 @@
 import streamlit as st
-import fitz  # PyMuPDF
-import pytesseract
-from pdf2image import convert_from_bytes
-import re
+from land_info import (DUPLICATE_COLUMN, EXCEL_COLUMNS, OCR_MODES, extract_land_info, extract_land_info_for_excel,
+                       extract_texts_from_scanned_pdfs, find_duplicate_files, upload_hash, upload_id)
+from docx_export import ZIP_MIME, render_docx_zip
+from export_writer import EXPORT_FORMATS, EXPORT_MIMES, export_bytes
+from job_queue import FINISHED, PAGE_PROGRESS_MODES, QueueFull, get_job, submit_job
+from parcel_store import PARCEL_STORE, export_docx_zip, make_record, search, upsert_records
+import metrics
 import os
+import time
 import pandas as pd
 from io import BytesIO
 
-# Cấu hình đường dẫn cho pytesseract và poppler (nếu cần)
-pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
-POPPLER_PATH = "/usr/bin"  # Thay nếu dùng Windows
+JOB_POLL_SECONDS = 1  # chu kỳ cập nhật tiến độ job chạy nền
+DUPLICATE_KINDS = {"exact": "giống hệt", "near": "bản scan khác"}
+# Bản scan gần giống chỉ bị đánh dấu trùng khi đọc được ít nhất một trường định danh này
+NEAR_DUPLICATE_KEYS = ["Số phát hành", "Thửa"]
+OCR_MODE_LABELS = {
+    "full": "OCR cả trang",
+    "roi": "⚡ Chỉ OCR vùng chứa thông tin thửa đất (nhanh hơn)",
+    "adaptive": "🎯 Thích nghi: OCR nhanh, chỉ đọc lại kỹ vùng chưa chắc chắn",
+}
 
 st.set_page_config(page_title="OCR Sổ Địa Chính", layout="wide")
 st.title("📜 Trích xuất thông tin thửa đất từ nhiều file PDF")
 
-def clean_text(text):
-    replacements = {
-        "m°": "m²", "m 2": "m²", "lôai": "loại", "địạ": "địa", "CCCD sô": "CCCD số",
-        "GCN:": "Giấy chứng nhận:", "<t": "1", "t3": "13", "tháng .": "tháng ",
-        "năm²": "năm ", "năm:": "năm ", "tháng:": "tháng ", "ngày:": "ngày ", "²": ""
-    }
-    for wrong, right in replacements.items():
-        text = text.replace(wrong, right)
-    lines = text.split("\n")
-    cleaned_lines = [re.sub(r"\s+", " ", line).strip() for line in lines if line.strip()]
-    return "\n".join(cleaned_lines).strip()
-
-def extract_text_from_scanned_pdf(pdf_bytes):
-    images = convert_from_bytes(pdf_bytes.read(), poppler_path=POPPLER_PATH)
-    extracted_text = ""
-    for img in images:
-        text = pytesseract.image_to_string(img, lang="vie")
-        extracted_text += text + "\n"
-    return clean_text(extracted_text)
-
-def extract_loai_dat(text):
-    match = re.search(r"Loại đất[:\-]?\s*(.*?)(?=\.)", text, re.IGNORECASE | re.DOTALL)
-    return match.group(1).strip(";: \n") if match else ""
-
-def extract_clean_field(text, field_label, stop_labels=None):
-    if stop_labels:
-        stop_pattern = '|'.join([rf"{re.escape(label)}(?:[:\-])?" for label in stop_labels])
-        pattern = rf"{re.escape(field_label)}[:\-]?\s*(.*?)(?=\n\s*(?:{stop_pattern})|\n|$)"
-    else:
-        pattern = rf"{re.escape(field_label)}[:\-]?\s*(.*?)(?=\.\s*\n|\n|$)"
-    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-    return match.group(1).strip() if match else ""
-
-def extract_xa_from_diachi(dia_chi):
-    match = re.search(r"(xã|phường|thị trấn)\s+[^\-,\n]+", dia_chi, re.IGNORECASE)
-    return match.group(0).strip().title() if match else ""
-
-def extract_land_info_for_excel(text):
-    thua_so = re.search(r"Thửa đất số:\s*(\d+)", text, re.IGNORECASE)
-    to_ban_do_so = re.search(r"tờ bản đồ số:\s*(\d+)", text, re.IGNORECASE)
-    dien_tich = re.search(r"Diện tích:\s*([\d.,]+)\s*m²?", text, re.IGNORECASE)
-    dia_chi = extract_clean_field(text, "Địa chỉ", ["Thời hạn", "Nguồn gốc", "Tên tài sản"])
-    so_phat_hanh_GCN = ""
-    context_match = re.search(r"(CHI NHÁNH[\s\S]{0,300})", text, re.IGNORECASE)
-    if context_match:
-        context_block = context_match.group(1)
-        match = re.search(r"\b([A-Z]{2}\s*\d{6,})\b", context_block)
-        if match:
-            so_phat_hanh_GCN = match.group(1).strip()
-
-    nguoi_su_dung_matches = re.findall(
-        r"(?:Ông|Bà):\s*([^\n,]+?),\s*CCCD số:\s*(\d+)", text
-    )
-    nguoi_su_dung = nguoi_su_dung_matches[0][0].strip() if nguoi_su_dung_matches else ""
 
-    return {
-        "Chủ sở hữu": nguoi_su_dung,
-        "Thửa": thua_so.group(1).strip() if thua_so else "",
-        "Tờ": to_ban_do_so.group(1).strip() if to_ban_do_so else "",
-        "Diện tích": dien_tich.group(1).strip() if dien_tich else "",
-        "Xã": extract_xa_from_diachi(dia_chi),
-        "Số phát hành": so_phat_hanh_GCN
-    }
+# Bảng thời gian từng bước (ms) của mỗi file, từ kết quả đo của metrics.py
+def show_metrics(summaries):
+    table = []
+    for summary in summaries:
+        if summary is None:
+            continue
+        row = {
+            "Tên file": summary["file"],
+            "Số trang": summary["pages"],
+            "Tổng (s)": summary["wall_seconds"],
+            "CPU (s)": summary["cpu_seconds"],
+            "RSS đỉnh tiến trình (MB)": summary.get("process_max_rss_mb", summary.get("max_rss_mb")),
+            "Trang bỏ qua": sum(summary.get("skipped_pages", {}).values()),
+        }
+        for name, stats in summary["stages"].items():
+            row[f"{name} (ms)"] = round(stats["wall_seconds"] * 1000, 1)
+        table.append(row)
+    st.dataframe(pd.DataFrame(table))
 
-# Giao diện upload
-uploaded_files = st.file_uploader("📂 Chọn nhiều file PDF", type=["pdf"], accept_multiple_files=True)
 
-if uploaded_files:
-    results = []
-    with st.spinner("🔍 Đang xử lý các file..."):
-        for uploaded_file in uploaded_files:
-            text = extract_text_from_scanned_pdf(uploaded_file)
-            info = extract_land_info_for_excel(text)
-            info["Tên file"] = uploaded_file.name
-            results.append(info)
-
-    df = pd.DataFrame(results)
+# Hiển thị bảng kết quả và các nút tải Excel, DOCX (ZIP)
+def show_results(file_names, rows, texts, summaries=None):
+    df = pd.DataFrame(rows)
     st.success("✅ Đã trích xuất xong!")
 
     # Hiển thị bảng kết quả
     st.dataframe(df)
 
-    # Xuất Excel
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name="ThongTinDat")
+    # Trang trắng, sơ đồ, phụ lục không OCR (xem page_triage.py)
+    skipped = sum(sum(s.get("skipped_pages", {}).values()) for s in summaries or [] if s)
+    if skipped:
+        st.caption(f"⏭️ Đã bỏ qua {skipped} trang trắng / sơ đồ / phụ lục không cần OCR")
+
+    if summaries and st.checkbox("⏱️ Hiện thời gian từng bước"):
+        show_metrics(summaries)
+
+    # Xuất Excel (hoặc CSV, Parquet)
+    fmt = st.selectbox("Định dạng file kết quả", EXPORT_FORMATS)
     st.download_button(
-        label="📥 Tải Excel",
-        data=output.getvalue(),
-        file_name="ThongTinThuaDat.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        label=f"📥 Tải {fmt.upper()}",
+        data=export_bytes(rows, EXCEL_COLUMNS + [DUPLICATE_COLUMN], fmt),
+        file_name=f"ThongTinThuaDat.{fmt}",
+        mime=EXPORT_MIMES[fmt]
     )
+
+    # Xuất DOCX cho từng file theo template, gộp thành một file ZIP
+    if st.button("📦 Xuất DOCX cho tất cả các file (ZIP)"):
+        with st.spinner("Đang xuất file DOCX..."):
+            records = (
+                (os.path.splitext(file_name)[0] + ".docx", *extract_land_info(text))
+                for file_name, text in zip(file_names, texts)
+            )
+            zip_data = render_docx_zip(records)
+        st.download_button(
+            label="📥 Tải DOCX (ZIP)",
+            data=zip_data,
+            file_name="GCN_DOCX.zip",
+            mime=ZIP_MIME
+        )
+
+
+# OCR và trích xuất cả lô upload; trả về tên file, dòng kết quả, text và thời gian
+# từng bước của mỗi file
+def process_uploads(uploaded_files, ocr_mode):
+    results = []
+    summaries = []
+    # Mỗi file một record đo thời gian; các trang OCR ở tiến trình con được cộng vào đúng file
+    records = [metrics.new_document(f.name) for f in uploaded_files]
+    # File giống hệt một file đứng trước trong lô thì dùng lại kết quả, không OCR lại.
+    # File gần giống vẫn OCR, chỉ đánh dấu trùng khi trích xuất ra cùng thông tin.
+    hashes = [upload_hash(f) for f in uploaded_files]
+    duplicates = find_duplicate_files(uploaded_files, records, hashes)
+    originals = [index for index, duplicate in enumerate(duplicates) if duplicate is None or duplicate[1] == "near"]
+    texts = dict(zip(originals, extract_texts_from_scanned_pdfs(
+        [uploaded_files[index] for index in originals], mode=ocr_mode,
+        records=[records[index] for index in originals],
+    )))
+    for index, (uploaded_file, record) in enumerate(zip(uploaded_files, records)):
+        duplicate = duplicates[index]
+        if duplicate is not None and duplicate[1] == "exact":
+            texts[index] = texts[duplicate[0]]
+            info = dict(results[duplicate[0]])
+        else:
+            with metrics.active(record):
+                info = extract_land_info_for_excel(texts[index])
+            # Bản scan gần giống nhưng khác thông tin (vd. thửa liền kề cùng chủ) không phải trùng;
+            # hai file không đọc được trường định danh nào (toàn trường rỗng) cũng không coi là trùng
+            if duplicate is not None and (
+                    not any(info[field] for field in NEAR_DUPLICATE_KEYS)
+                    or any(value != results[duplicate[0]][field] for field, value in info.items())):
+                duplicate = None
+        info[DUPLICATE_COLUMN] = f"{uploaded_files[duplicate[0]].name} ({DUPLICATE_KINDS[duplicate[1]]})" if duplicate else ""
+        info["Tên file"] = uploaded_file.name
+        results.append(info)
+        summary = metrics.finish_document(record)
+        metrics.publish(summary)
+        summaries.append(summary)
+    # Lưu vào kho để tra cứu, xuất lại sau (file giống hệt file khác không cần lưu lại)
+    if PARCEL_STORE:
+        upsert_records(
+            make_record(info, texts[index], source_hash=hashes[index]) for index, info in enumerate(results)
+            if duplicates[index] is None or duplicates[index][1] == "near"
+        )
+    return {
+        "file_names": [f.name for f in uploaded_files],
+        "rows": results,
+        "texts": [texts[index] for index in range(len(uploaded_files))],
+        "summaries": summaries,
+    }
+
+
+# Tiến độ job chạy nền: số file đã xong của cả lô, và mỗi file một thanh tiến độ theo
+# số trang đã OCR (chế độ roi/adaptive chỉ có tiến độ theo file, xem job_queue.py)
+def show_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        st.warning("Không tìm thấy job (có thể đã bị xoá). Hãy upload lại file.")
+        del st.query_params["job"]
+        return
+
+    if not job["done"]:
+        # Tải trước kết quả của các file đã xong trong khi lô vẫn đang chạy
+        rows = [{**f["row"], "Tên file": f["name"]} for f in job["files"] if f["status"] == "ok"]
+        if rows:
+            st.download_button(
+                label=f"📥 Tải kết quả tạm thời ({len(rows)}/{len(job['files'])} file, CSV)",
+                data=export_bytes(rows, EXCEL_COLUMNS, "csv"),
+                file_name="ThongTinThuaDat_tam.csv",
+                mime=EXPORT_MIMES["csv"],
+                key="partial_csv",
+            )
+        files_done = sum(f["status"] in FINISHED for f in job["files"])
+        st.progress(files_done / len(job["files"]), text=f"Đã xong {files_done}/{len(job['files'])} file")
+        for f in job["files"]:
+            if f["status"] == "queued":
+                st.progress(0.0, text=f"⏳ {f['name']}: đang chờ")
+            elif f["status"] == "running" and job["mode"] not in PAGE_PROGRESS_MODES:
+                st.progress(0.0, text=f"🔍 {f['name']}: đang OCR ({f['pages_total']} trang)")
+            elif f["status"] == "running":
+                fraction = f["pages_done"] / f["pages_total"] if f["pages_total"] else 0.0
+                st.progress(fraction, text=f"🔍 {f['name']}: {f['pages_done']}/{f['pages_total']} trang")
+            else:
+                st.progress(1.0, text=f"✔️ {f['name']}")
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+    job = get_job(job_id, with_text=True)
+    ok_files = [f for f in job["files"] if f["status"] == "ok"]
+    for f in job["files"]:
+        if f["status"] == "error":
+            st.error(f"❌ {f['name']}: {f['error']}")
+    rows = [{**f["row"], "Tên file": f["name"]} for f in ok_files]
+    show_results([f["name"] for f in ok_files], rows, [f["text"] for f in ok_files],
+                 [f["metrics"] for f in job["files"]])
+    if st.button("🆕 Xử lý lô file mới"):
+        del st.query_params["job"]
+        st.rerun()
+
+
+# Tra cứu kết quả đã lưu (parcel_store.py) và xuất lại Excel/DOCX không cần OCR lại
+def show_store_search():
+    with st.expander("🔎 Tra cứu kết quả đã lưu"):
+        query = st.text_input("Tên, CCCD, xã hoặc số phát hành (không cần gõ dấu)")
+        if not query:
+            return
+        found = search(query)
+        if not found:
+            st.info("Không tìm thấy kết quả phù hợp.")
+            return
+        rows = [record["row"] for record in found]
+        st.dataframe(pd.DataFrame(rows))
+        st.download_button(
+            label="📥 Tải Excel",
+            data=export_bytes(rows, EXCEL_COLUMNS, "xlsx"),
+            file_name="TraCuuThuaDat.xlsx",
+            mime=EXPORT_MIMES["xlsx"],
+            key="store_xlsx",
+        )
+        if st.button("📦 Xuất DOCX các kết quả tra cứu (ZIP)"):
+            output = BytesIO()
+            export_docx_zip(found, output)
+            st.download_button(
+                label="📥 Tải DOCX (ZIP)",
+                data=output.getvalue(),
+                file_name="TraCuu_DOCX.zip",
+                mime=ZIP_MIME,
+                key="store_zip",
+            )
+
+
+show_store_search()
+
+# Mã job nằm trên URL nên tải lại trang hoặc mất kết nối vẫn xem tiếp được
+job_id = st.query_params.get("job")
+if job_id:
+    show_job(job_id)
+    st.stop()
+
+# Giao diện upload
+uploaded_files = st.file_uploader("📂 Chọn nhiều file PDF", type=["pdf"], accept_multiple_files=True)
+
+ocr_mode = st.radio("Chế độ OCR", OCR_MODES, horizontal=True, format_func=OCR_MODE_LABELS.get)
+background = st.checkbox("🕒 Chạy nền (xem tiến độ, không mất kết quả khi tải lại trang)")
+
+if uploaded_files and background:
+    if st.button("▶️ Bắt đầu xử lý"):
+        try:
+            job_id = submit_job(uploaded_files, mode=ocr_mode)
+        except QueueFull as e:
+            st.warning(f"⚠️ {e}")
+        else:
+            st.query_params["job"] = job_id
+            st.rerun()
+elif uploaded_files:
+    # Kết quả của lô được giữ trong session_state: chọn định dạng file, bật bảng thời
+    # gian hay bấm xuất DOCX làm Streamlit chạy lại script nhưng không OCR, đo thời
+    # gian hay lưu vào kho lại; chỉ xử lý lại khi đổi file upload hoặc chế độ OCR.
+    batch_key = (tuple(upload_id(f) for f in uploaded_files), ocr_mode)
+    batch = st.session_state.get("batch")
+    if batch is None or batch["key"] != batch_key:
+        st.session_state.pop("batch", None)  # giải phóng kết quả lô cũ trước khi xử lý lô mới
+        with st.spinner("🔍 Đang xử lý các file..."):
+            batch = {"key": batch_key, **process_uploads(uploaded_files, ocr_mode)}
+        st.session_state["batch"] = batch
+
+    show_results(batch["file_names"], batch["rows"], batch["texts"], batch["summaries"])
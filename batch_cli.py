@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import metrics
+from export_writer import EXPORT_FORMATS, close_writer, export_format, open_writer, write_row, write_rows
+from land_info import EXCEL_COLUMNS, extract_land_info, extract_land_info_for_excel, extract_text_from_scanned_pdf
+from ocr_cache import content_hash
+from parcel_store import PARCEL_DB, PARCEL_STORE, connect as connect_store, make_record, upsert_records
+
+# Chạy trích xuất hàng loạt cho cả thư mục "sổ địa chính" không cần giao diện.
+# Mỗi file xong được ghi ngay vào manifest (JSONL) nên khi bị dừng giữa chừng,
+# chạy lại cùng lệnh sẽ bỏ qua các file đã xử lý và tiếp tục từ chỗ dừng.
+# Trong lúc chạy, các dòng kết quả được ghi dần ra file CSV tạm (--partial) để
+# xem trước; file kết quả (xlsx, csv hoặc parquet theo đuôi file) được ghi
+# từng dòng khi lô xong.
+#
+#   python batch_cli.py /data/so_dia_chinh -o ThongTinThuaDat.xlsx --workers 16
+
+
+# Liệt kê đệ quy các file PDF trong thư mục (thứ tự cố định để kết quả ổn định)
+def find_pdfs(input_dir):
+    paths = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+# Dấu hiệu nhận biết file đã thay đổi kể từ lần chạy trước
+def file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+# Đọc manifest: trả về bản ghi cuối cùng của mỗi file (dòng sau ghi đè dòng trước)
+def load_manifest(manifest_path):
+    entries = {}
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # dòng ghi dở khi tiến trình bị dừng đột ngột
+            entries[entry["path"]] = entry
+    return entries
+
+
+def append_manifest(manifest_file, entry):
+    manifest_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+
+
+# Xử lý một file trong tiến trình con: OCR tuần tự các trang (song song ở mức file).
+# Kết quả kèm thời gian từng bước (metrics.py) để tiến trình cha ghi log, text và
+# dữ liệu DOCX để lưu vào kho kết quả (parcel_store.py).
+def process_file(path, rel_path, mode="full"):
+    started = time.time()
+    with metrics.capture(rel_path) as record:
+        try:
+            text = extract_text_from_scanned_pdf(path, workers=1, mode=mode)
+            info = extract_land_info_for_excel(text)
+            info["Tên file"] = rel_path
+            land_info, nguoi_su_dung = extract_land_info(text)
+            result = {"status": "ok", "row": info, "text": text, "land_info": land_info, "nguoi_su_dung": nguoi_su_dung,
+                      "source_hash": content_hash(path)}
+        except Exception as e:
+            result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    return {**result, "seconds": round(time.time() - started, 3), "metrics": record["summary"]}
+
+
+def is_done(entry, signature):
+    return (
+        entry is not None and entry["status"] == "ok"
+        and entry["size"] == signature["size"] and entry["mtime"] == signature["mtime"]
+    )
+
+
+# Các dòng kết quả của những file đã xử lý thành công, theo thứ tự đường dẫn
+def iter_rows(manifest):
+    for path in sorted(manifest):
+        if manifest[path]["status"] == "ok":
+            yield manifest[path]["row"]
+
+
+# partial_path: file CSV ghi thêm từng dòng ngay khi mỗi file xong (gồm cả các
+# file đã xong ở lần chạy trước), mở được bất cứ lúc nào trong khi lô đang chạy.
+# store_path: kho kết quả (parcel_store.py), các file xong cùng lúc được lưu trong một transaction.
+def run_batch(input_dir, manifest_path, workers, retry_errors=True, mode="full", partial_path=None,
+              store_path=None):
+    manifest = load_manifest(manifest_path)
+    todo = []
+    for path in find_pdfs(input_dir):
+        rel_path = os.path.relpath(path, input_dir)
+        signature = file_signature(path)
+        entry = manifest.get(rel_path)
+        if is_done(entry, signature):
+            continue
+        if entry is not None and entry["status"] == "error" and not retry_errors:
+            continue
+        todo.append((path, rel_path, signature))
+
+    total = len(todo)
+    print(f"{len(manifest)} file trong manifest, còn {total} file cần xử lý", file=sys.stderr)
+    if not todo:
+        return manifest
+
+    partial = open_writer(partial_path, EXCEL_COLUMNS, "csv") if partial_path else None
+    if partial:
+        for row in iter_rows(manifest):
+            write_row(partial, row)
+    store = connect_store(store_path) if store_path else None
+    done = 0
+    with open(manifest_path, "a", encoding="utf-8") as manifest_file, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = iter(todo)
+        running = {}
+        # Giới hạn số file đang chờ để không giữ hàng chục nghìn future trong bộ nhớ
+        while True:
+            while len(running) < workers * 2:
+                item = next(queue, None)
+                if item is None:
+                    break
+                running[pool.submit(process_file, item[0], item[1], mode)] = item
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            stored = []
+            for future in finished:
+                _, rel_path, signature = running.pop(future)
+                entry = {"path": rel_path, **signature, **future.result()}
+                metrics.publish(entry["metrics"])
+                if entry["status"] == "ok":
+                    # text và dữ liệu DOCX chỉ lưu vào kho, không ghi vào manifest
+                    stored.append(make_record(entry["row"], entry.pop("text"), entry.pop("land_info"),
+                                              entry.pop("nguoi_su_dung"), entry.pop("source_hash")))
+                append_manifest(manifest_file, entry)
+                manifest[rel_path] = entry
+                if partial and entry["status"] == "ok":
+                    write_row(partial, entry["row"])
+                done += 1
+                status = entry["status"] if entry["status"] == "ok" else entry["error"]
+                skipped = sum((entry["metrics"] or {}).get("skipped_pages", {}).values())
+                if skipped:
+                    status += f", bỏ qua {skipped} trang"
+                print(f"[{done}/{total}] {rel_path}: {status} ({entry['seconds']}s)", file=sys.stderr)
+            if store and stored:
+                upsert_records(stored, conn=store)
+    if store:
+        store.close()
+    if partial:
+        close_writer(partial)
+    return manifest
+
+
+# Xuất kết quả với cùng các cột như sheet ThongTinDat của app.py; định dạng theo
+# đuôi file (xlsx, csv, parquet), ghi từng dòng nên không cần dựng DataFrame cả lô
+def write_output(manifest, output_path):
+    return write_rows(iter_rows(manifest), output_path, EXCEL_COLUMNS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trích xuất thông tin thửa đất hàng loạt từ thư mục PDF")
+    parser.add_argument("input_dir", help="Thư mục chứa các file PDF (quét đệ quy)")
+    parser.add_argument("-o", "--output", default="ThongTinThuaDat.xlsx",
+                        help=f"File kết quả, định dạng theo đuôi file ({', '.join(EXPORT_FORMATS)})")
+    parser.add_argument("--manifest", help="File checkpoint JSONL (mặc định: <output>.manifest.jsonl)")
+    parser.add_argument("--partial", help="File CSV kết quả tạm thời trong lúc chạy (mặc định: <output>.partial.csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Số file xử lý song song")
+    parser.add_argument("--skip-errors", action="store_true", help="Không thử lại các file đã lỗi ở lần chạy trước")
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("--roi", action="store_true", help="Chỉ OCR các vùng chứa thông tin thửa đất")
+    modes.add_argument("--adaptive", action="store_true",
+                       help="OCR nhanh ở DPI thấp, chỉ OCR lại ở DPI cao vùng thiếu trường hoặc đọc không chắc chắn")
+    parser.add_argument("--store", default=PARCEL_DB if PARCEL_STORE else None,
+                        help="Kho kết quả để tra cứu, xuất lại sau (mặc định: OCR_PARCEL_DB)")
+    parser.add_argument("--no-store", action="store_const", const=None, dest="store", help="Không lưu vào kho kết quả")
+    args = parser.parse_args(argv)
+    try:
+        export_format(args.output)
+    except ValueError as e:
+        parser.error(str(e))
+
+    manifest_path = args.manifest or os.path.splitext(args.output)[0] + ".manifest.jsonl"
+    partial_path = args.partial or os.path.splitext(args.output)[0] + ".partial.csv"
+    mode = "roi" if args.roi else "adaptive" if args.adaptive else "full"
+    manifest = run_batch(args.input_dir, manifest_path, args.workers, retry_errors=not args.skip_errors,
+                         mode=mode, partial_path=partial_path, store_path=args.store)
+    count = write_output(manifest, args.output)
+    if os.path.exists(partial_path) and os.path.abspath(partial_path) != os.path.abspath(args.output):
+        os.remove(partial_path)
+    errors = sum(1 for entry in manifest.values() if entry["status"] != "ok")
+    print(f"Đã ghi {count} dòng vào {args.output} ({errors} file lỗi)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from field_extraction import extract_land_info, extract_land_info_for_excel, normalize_vietnamese_date
+
+# So sánh bộ trích xuất một lần quét (field_extraction) với cách cũ gồm nhiều lần
+# re.search trên cả văn bản. Kết quả của hai cách phải giống hệt nhau.
+#
+#   python benchmarks/bench_field_extraction.py [số văn bản] [số trang mỗi văn bản]
+
+
+# --- Cách cũ (sao chép từ app_single.py và app.py trước khi dùng chung) ---
+
+def legacy_extract_clean_field(text, field_label, stop_labels=None):
+    if stop_labels:
+        stop_pattern = '|'.join([rf"{re.escape(label)}(?:[:\-])?" for label in stop_labels])
+        pattern = rf"{re.escape(field_label)}[:\-]?\s*(.*?)(?=\n\s*(?:{stop_pattern})|\n|$)"
+    else:
+        pattern = rf"{re.escape(field_label)}[:\-]?\s*(.*?)(?=\.\s*\n|\n|$)"
+    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    return match.group(1).strip() if match else ""
+
+
+def legacy_extract_loai_dat(text):
+    match = re.search(r"Loại đất[:\-]?\s*(.*?)(?=\.)", text, re.IGNORECASE | re.DOTALL)
+    return match.group(1).strip(";: \n") if match else ""
+
+
+def legacy_extract_xa_from_diachi(dia_chi):
+    match = re.search(r"(xã|phường|thị trấn)\s+[^\-,\n]+", dia_chi, re.IGNORECASE)
+    return match.group(0).strip().title() if match else ""
+
+
+def legacy_extract_land_info(text):
+    thua_so = re.search(r"Thửa đất số:\s*(\d+)", text, re.IGNORECASE)
+    to_ban_do_so = re.search(r"tờ bản đồ số:\s*(\d+)", text, re.IGNORECASE)
+    dien_tich = re.search(r"Diện tích:\s*([\d.,]+)\s*m²?", text, re.IGNORECASE)
+
+    loai_dat = legacy_extract_loai_dat(text)
+    hinh_thuc_su_dung = legacy_extract_clean_field(text, "Hình thức sử dụng đất", ["Địa chỉ", "Thời hạn"])
+    dia_chi = legacy_extract_clean_field(text, "Địa chỉ", ["Thời hạn", "Nguồn gốc", "Tên tài sản"])
+    thoi_han_su_dung = legacy_extract_loai_dat(text)
+    nguon_goc_su_dung = legacy_extract_clean_field(text, "Nguồn gốc sử dụng", ["Thời điểm đăng ký", "Số vào sổ"])
+    thoi_diem_dang_ky = legacy_extract_clean_field(text, "Thời điểm đăng ký vào sổ địa chính", ["Số vào sổ", "Ghi chú"])
+    so_vao_so_cap_GCN = legacy_extract_clean_field(text, "Số vào sổ cấp Giấy chứng nhận", ["Ghi chú", "Chi nhánh"])
+    noi_dung = re.search(r"Ghi chú[:\-]?\s*(.*?)(?=\.)", text, re.IGNORECASE | re.DOTALL)
+
+    thoi_diem_dang_ky_GCN_raw = re.search(r"(ngày\s*\d{0,2}[\s\S]{0,60}năm\s*\d{4})", text, re.IGNORECASE)
+
+    context_match = re.search(r"(CHI NHÁNH[\s\S]{0,300})", text, re.IGNORECASE)
+    so_phat_hanh_GCN = None
+    if context_match:
+        context_block = context_match.group(1)
+        so_phat_hanh_GCN = re.search(r"\b([A-Z]{2}\s*\d{6,})\b", context_block)
+
+    nguoi_su_dung_matches = re.findall(
+        r"(?:Ông|Bà):\s*([^\n,]+?),\s*CCCD số:\s*(\d+)(?:,\s*Địa chỉ:\s*([\s\S]*?))?\.",
+        text
+    )
+    nguoi_su_dung = {}
+    for i, (ten, cccd, dia_chi_nguoi) in enumerate(nguoi_su_dung_matches, start=1):
+        nguoi_su_dung[f"TenNguoi_{i}"] = ten.strip()
+        nguoi_su_dung[f"SoCCCD_{i}"] = cccd.strip()
+        nguoi_su_dung[f"DiaChiNguoi_{i}"] = dia_chi_nguoi.strip() if dia_chi_nguoi else ""
+
+    return {
+        "SoThua": thua_so.group(1).strip() if thua_so else "",
+        "SoToBanDo": to_ban_do_so.group(1).strip() if to_ban_do_so else "",
+        "DienTich": dien_tich.group(1).strip() if dien_tich else "",
+        "LoaiDat": loai_dat,
+        "HinhThucSuDung": hinh_thuc_su_dung,
+        "DiaChi": dia_chi,
+        "ThoiHanSuDung": thoi_han_su_dung,
+        "NguonGocSuDung": nguon_goc_su_dung,
+        "ThoiDiemDangKy": thoi_diem_dang_ky,
+        "SoPhatHanhGCN": so_phat_hanh_GCN.group(1).strip() if so_phat_hanh_GCN else "",
+        "SoVaoSoCapGCN": so_vao_so_cap_GCN,
+        "ThoiDiemDangKyGCN": normalize_vietnamese_date(thoi_diem_dang_ky_GCN_raw.group(1)) if thoi_diem_dang_ky_GCN_raw else "",
+        "NoiDung": noi_dung.group(1).strip() if noi_dung else ""
+    }, nguoi_su_dung
+
+
+def legacy_extract_land_info_for_excel(text):
+    thua_so = re.search(r"Thửa đất số:\s*(\d+)", text, re.IGNORECASE)
+    to_ban_do_so = re.search(r"tờ bản đồ số:\s*(\d+)", text, re.IGNORECASE)
+    dien_tich = re.search(r"Diện tích:\s*([\d.,]+)\s*m²?", text, re.IGNORECASE)
+    dia_chi = legacy_extract_clean_field(text, "Địa chỉ", ["Thời hạn", "Nguồn gốc", "Tên tài sản"])
+    so_phat_hanh_GCN = ""
+    context_match = re.search(r"(CHI NHÁNH[\s\S]{0,300})", text, re.IGNORECASE)
+    if context_match:
+        context_block = context_match.group(1)
+        match = re.search(r"\b([A-Z]{2}\s*\d{6,})\b", context_block)
+        if match:
+            so_phat_hanh_GCN = match.group(1).strip()
+
+    nguoi_su_dung_matches = re.findall(
+        r"(?:Ông|Bà):\s*([^\n,]+?),\s*CCCD số:\s*(\d+)", text
+    )
+    nguoi_su_dung = nguoi_su_dung_matches[0][0].strip() if nguoi_su_dung_matches else ""
+
+    return {
+        "Chủ sở hữu": nguoi_su_dung,
+        "Thửa": thua_so.group(1).strip() if thua_so else "",
+        "Tờ": to_ban_do_so.group(1).strip() if to_ban_do_so else "",
+        "Diện tích": dien_tich.group(1).strip() if dien_tich else "",
+        "Xã": legacy_extract_xa_from_diachi(dia_chi),
+        "Số phát hành": so_phat_hanh_GCN
+    }
+
+
+# --- Dữ liệu giả lập ---
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Vũ", "Đặng", "Bùi"]
+TEN = ["Văn An", "Thị Bình", "Minh Châu", "Đức Dũng", "Thị Hoa", "Quang Huy"]
+XA = ["xã Tân Lập", "phường Quang Trung", "thị trấn Phú Xuyên", "xã Đông Hòa"]
+FILLER = [
+    "CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM",
+    "Độc lập - Tự do - Hạnh phúc",
+    "GIẤY CHỨNG NHẬN QUYỀN SỬ DỤNG ĐẤT",
+    "QUYỀN SỞ HỮU NHÀ Ở VÀ TÀI SẢN KHÁC GẮN LIỀN VỚI ĐẤT",
+    "Những thay đổi sau khi cấp giấy chứng nhận",
+    "Nội dung thay đổi và cơ sở pháp lý",
+    "Xác nhận của cơ quan có thẩm quyền",
+]
+
+
+def make_owner(rng):
+    name = f"{rng.choice(HO)} {rng.choice(TEN)}"
+    cccd = "".join(rng.choice("0123456789") for _ in range(12))
+    title = rng.choice(["Ông", "Bà"])
+    if rng.random() < 0.5:
+        return f"{title}: {name}, CCCD số: {cccd}, Địa chỉ: {rng.choice(XA)}, huyện Phú Xuyên."
+    return f"{title}: {name}, CCCD số: {cccd}."
+
+
+def make_page(rng):
+    lines = rng.sample(FILLER, 3)
+    lines += [make_owner(rng) for _ in range(rng.randint(0, 3))]
+    fields = [
+        f"Thửa đất số: {rng.randint(1, 999)}, tờ bản đồ số: {rng.randint(1, 99)}",
+        f"Diện tích: {rng.randint(50, 5000)}.{rng.randint(0, 9)} m²",
+        f"Loại đất: {rng.choice(['Đất ở tại nông thôn', 'Đất trồng lúa', 'Đất ở tại đô thị'])}.",
+        "Hình thức sử dụng đất: Sử dụng riêng",
+        f"Địa chỉ: thôn {rng.randint(1, 9)}, {rng.choice(XA)}, huyện Phú Xuyên",
+        "Thời hạn: Lâu dài.",
+        "Nguồn gốc sử dụng: Nhà nước giao đất có thu tiền sử dụng đất",
+        f"Thời điểm đăng ký vào sổ địa chính: ngày {rng.randint(1, 28)} tháng {rng.randint(1, 12)} năm {rng.randint(1995, 2024)}",
+        f"Số vào sổ cấp Giấy chứng nhận: CS {rng.randint(1000, 99999)}",
+        "Ghi chú: Không.",
+        f"CHI NHÁNH VĂN PHÒNG ĐĂNG KÝ ĐẤT ĐAI\n{rng.choice(['CX', 'DA', 'BV'])} {rng.randint(100000, 999999)}",
+    ]
+    lines += [field for field in fields if rng.random() < 0.7]
+    rng.shuffle(lines)
+    return "\n".join(lines)
+
+
+def make_document(rng, pages):
+    return "\n".join(make_page(rng) for _ in range(pages))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = random.Random(42)
+    documents = [make_document(rng, pages) for _ in range(count)]
+
+    for text in documents:
+        assert extract_land_info(text) == legacy_extract_land_info(text)
+        assert extract_land_info_for_excel(text) == legacy_extract_land_info_for_excel(text)
+    print(f"Kết quả giống nhau trên {count} văn bản ({pages} trang/văn bản)")
+
+    def run(fn):
+        return lambda: [fn(text) for text in documents]
+
+    for name, new_fn, old_fn in [
+        ("extract_land_info", extract_land_info, legacy_extract_land_info),
+        ("extract_land_info_for_excel", extract_land_info_for_excel, legacy_extract_land_info_for_excel),
+    ]:
+        new_time = min(timeit.repeat(run(new_fn), number=1, repeat=15))
+        old_time = min(timeit.repeat(run(old_fn), number=1, repeat=15))
+        print(f"{name}: cũ {old_time * 1000:.1f} ms, mới {new_time * 1000:.1f} ms, nhanh hơn {old_time / new_time:.2f} lần")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_cli import find_pdfs
+from ocr_backend import active_backend, image_to_string
+from ocr_engine import OCR_DPI, OCR_LANG, open_pdf, render_pages
+from preprocess import preprocess_image
+
+# So sánh thời gian OCR từng trang giữa pytesseract (chạy lệnh tesseract mỗi
+# trang) và tesserocr (engine nạp sẵn trong tiến trình) trên cùng các ảnh đã
+# tiền xử lý. Cần cài tesserocr và có bản scan thật:
+#
+#   python benchmarks/bench_ocr_backend.py /data/so_dia_chinh [số trang tối đa]
+
+
+def main():
+    input_dir = sys.argv[1]
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    backends = ["pytesseract", "tesserocr"]
+    if active_backend("tesserocr") != "tesserocr":
+        sys.exit("Chưa cài tesserocr (hoặc không khởi tạo được), không có gì để so sánh")
+
+    images = []
+    for path in find_pdfs(input_dir):
+        with open_pdf(path) as doc:
+            page_count = doc.page_count
+        for index in range(min(page_count, max_pages - len(images))):
+            img = render_pages(path, index, index, OCR_DPI)[0]
+            images.append(preprocess_image(img, OCR_DPI))
+        if len(images) >= max_pages:
+            break
+
+    image_to_string(images[0], OCR_LANG, backend="tesserocr")  # khởi tạo engine trước khi đo
+    texts = {}
+    for backend in backends:
+        started = time.perf_counter()
+        texts[backend] = [image_to_string(img, OCR_LANG, backend=backend) for img in images]
+        seconds = time.perf_counter() - started
+        print(f"{backend}: {seconds / len(images) * 1000:.0f} ms/trang ({len(images)} trang)")
+    same = sum(a.strip() == b.strip() for a, b in zip(*texts.values()))
+    print(f"Text giống nhau trên {same}/{len(images)} trang")
+
+
+if __name__ == "__main__":
+    main()
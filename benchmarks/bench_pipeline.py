@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import dedup
+import metrics
+import ocr_cache
+import page_triage
+from docx_export import render_docx
+from export_writer import export_bytes
+from land_info import (EXCEL_COLUMNS, OCR_MODES, extract_land_info, extract_land_info_for_excel,
+                       extract_texts_from_scanned_pdfs)
+from ocr_backend import active_backend
+from ocr_engine import OCR_DPI, OCR_LANG, OCR_WORKERS
+from preprocess import OCR_PREPROCESS
+from synthetic_certificates import generate_dataset
+
+# Đo toàn bộ pipeline trên bộ giấy chứng nhận giả lập (benchmarks/synthetic_certificates.py)
+# qua đúng hàm các app dùng (land_info.extract_texts_from_scanned_pdfs, như app.py):
+# lớp text, phân loại trang, loại trang trùng, cache, pool OCR (OCR_WORKERS tiến trình)
+# và chế độ OCR (--mode full | roi | adaptive). Thời gian từng bước lấy từ metrics.py
+# (cộng dồn trên mọi tiến trình của pool), cùng thông lượng và độ chính xác từng trường
+# so với kết quả đúng, rồi so sánh với kết quả đã lưu (baseline). Mỗi lần chạy dùng
+# thư mục cache OCR trống để kết quả đo ổn định; --warm-cache chạy trước một lượt để
+# đo trường hợp cache đã có sẵn.
+#
+#   python benchmarks/bench_pipeline.py --save-baseline      # lưu kết quả làm baseline
+#   python benchmarks/bench_pipeline.py                      # so sánh với baseline
+#   python benchmarks/bench_pipeline.py --mode roi --baseline benchmarks/baseline_roi.json
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data", "synthetic")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+# Gọi fn và cộng thời gian chạy vào timings[stage]
+def timed(timings, stage, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    timings[stage] += time.perf_counter() - started
+    return result
+
+
+# Chạy pipeline cho cả bộ file như khi upload nhiều file lên app.py; trả về danh sách
+# (các trường trích xuất được + CCCD người đầu tiên, bản tóm tắt metrics) của từng file
+def run_documents(paths, mode):
+    pdfs = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pdfs.append(f.read())
+    records = [metrics.new_document(os.path.basename(path)) for path in paths]
+    texts = extract_texts_from_scanned_pdfs(pdfs, mode, records=records)
+    results = []
+    for text, record in zip(texts, records):
+        with metrics.active(record):
+            row = extract_land_info_for_excel(text)
+            land_info, nguoi_su_dung = extract_land_info(text)
+            render_docx(land_info, nguoi_su_dung, os.path.join(REPO_DIR, "template.docx"))
+        row["CCCD"] = nguoi_su_dung.get("SoCCCD_1", "")
+        results.append((row, metrics.finish_document(record)))
+    return results
+
+
+def run_benchmark(items, mode="full", warm_cache=False):
+    paths = [path for path, _ in items]
+    if warm_cache:
+        run_documents(paths, mode)
+
+    timings = {"export": 0.0}
+    correct = {}
+    rows = []
+    pages = 0
+    started = time.perf_counter()
+    for (row, summary), (_, expected) in zip(run_documents(paths, mode), items):
+        pages += summary["pages"]
+        for stage, stats in summary["stages"].items():
+            timings[stage] = timings.get(stage, 0.0) + stats["wall_seconds"]
+        rows.append({column: row.get(column, "") for column in EXCEL_COLUMNS})
+        for field, value in expected.items():
+            correct[field] = correct.get(field, 0) + (row.get(field, "") == value)
+    timed(timings, "export", export_bytes, rows, EXCEL_COLUMNS, "xlsx")
+    wall = time.perf_counter() - started
+
+    return {
+        "config": {
+            "backend": active_backend(), "preprocess": ",".join(OCR_PREPROCESS), "dpi": OCR_DPI, "lang": OCR_LANG,
+            "mode": mode, "workers": OCR_WORKERS, "triage": page_triage.TRIAGE, "dedup": dedup.DEDUP,
+            "warm_cache": warm_cache, "documents": len(items), "pages": pages,
+        },
+        "stages_ms_per_page": {stage: round(seconds * 1000 / pages, 2) for stage, seconds in timings.items()},
+        "throughput": {
+            "pages_per_second": round(pages / wall, 3),
+            "documents_per_second": round(len(items) / wall, 3),
+        },
+        "accuracy": {field: round(count / len(items), 4) for field, count in correct.items()},
+    }
+
+
+# So sánh với baseline: thời gian tăng quá `tolerance` (tỉ lệ) hoặc độ chính xác giảm
+# là bị coi là kém đi. Trả về danh sách các dòng mô tả chỗ kém đi.
+def compare(result, baseline, tolerance):
+    regressions = []
+    for stage, ms in result["stages_ms_per_page"].items():
+        old = baseline["stages_ms_per_page"].get(stage)
+        if old is None:
+            continue
+        change = (ms - old) / old if old else 0.0
+        print(f"  {stage:<11} {old:>9.2f} -> {ms:>9.2f} ms/trang ({change:+.1%})")
+        if old and change > tolerance:
+            regressions.append(f"{stage}: {old:.2f} -> {ms:.2f} ms/trang")
+    for field, accuracy in result["accuracy"].items():
+        old = baseline["accuracy"].get(field)
+        if old is None:
+            continue
+        print(f"  {field:<11} {old:>9.1%} -> {accuracy:>9.1%}")
+        if accuracy < old:
+            regressions.append(f"độ chính xác {field}: {old:.1%} -> {accuracy:.1%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline OCR trên giấy chứng nhận giả lập")
+    parser.add_argument("--count", type=int, default=20, help="Số giấy chứng nhận")
+    parser.add_argument("--pages", type=int, default=2, help="Số trang mỗi giấy chứng nhận")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dpi", type=int, default=OCR_DPI, help="DPI khi sinh PDF")
+    parser.add_argument("--mode", choices=OCR_MODES, default="full", help="Chế độ OCR (xem land_info.OCR_MODES)")
+    parser.add_argument("--warm-cache", action="store_true", help="Chạy trước một lượt để đo khi cache OCR đã có")
+    parser.add_argument("--no-noise", action="store_true", help="Không thêm nhiễu scan")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Lưu kết quả lần chạy này làm baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Mức tăng thời gian cho phép so với baseline")
+    parser.add_argument("--report", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args(argv)
+
+    items = generate_dataset(args.data_dir, args.count, args.pages, args.seed, args.dpi, not args.no_noise)
+    # Cache OCR riêng cho lần chạy này, xoá khi xong
+    with tempfile.TemporaryDirectory(prefix="bench_ocr_cache_") as cache_dir:
+        ocr_cache.OCR_CACHE_DIR = cache_dir
+        result = run_benchmark(items, args.mode, args.warm_cache)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Đã lưu baseline vào {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("Chưa có baseline (chạy với --save-baseline để tạo)")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["config"] != result["config"]:
+        print(f"Cảnh báo: cấu hình khác baseline {baseline['config']}")
+    print("So sánh với baseline:")
+    regressions = compare(result, baseline, args.tolerance)
+    for line in regressions:
+        print(f"KÉM ĐI: {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
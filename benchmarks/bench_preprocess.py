@@ -0,0 +1,54 @@
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_cli import find_pdfs
+from ocr_backend import image_to_string
+from ocr_engine import OCR_DPI, OCR_LANG, open_pdf, render_pages
+from preprocess import OCR_PREPROCESS, preprocess_image
+
+# So sánh thời gian OCR từng trang và số ký tự rác mà clean_text phải sửa
+# (m°, <t, t3...) khi đưa ảnh gốc và ảnh đã tiền xử lý vào Tesseract.
+# Cần bản scan thật nên không có dữ liệu giả lập:
+#
+#   python benchmarks/bench_preprocess.py /data/so_dia_chinh [số trang tối đa]
+
+GARBAGE = re.compile(r"m°|m 2|<t|\bt3|²|lôai|địạ")
+
+
+def main():
+    input_dir = sys.argv[1]
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f"Các bước tiền xử lý: {','.join(OCR_PREPROCESS) or '(tắt)'}")
+
+    totals = {"gốc": [0.0, 0, 0], "tiền xử lý": [0.0, 0, 0]}  # giây, ký tự rác, số trang
+    pages = 0
+    for path in find_pdfs(input_dir):
+        with open_pdf(path) as doc:
+            page_count = doc.page_count
+        for index in range(page_count):
+            if pages >= max_pages:
+                break
+            img = render_pages(path, index, index, OCR_DPI)[0]
+            for name in totals:
+                started = time.perf_counter()
+                prepared = preprocess_image(img, OCR_DPI) if name == "tiền xử lý" else img
+                text = image_to_string(prepared, OCR_LANG)
+                totals[name][0] += time.perf_counter() - started
+                totals[name][1] += len(GARBAGE.findall(text))
+                totals[name][2] += 1
+                if prepared is not img:
+                    prepared.close()
+            img.close()
+            pages += 1
+
+    for name, (seconds, garbage, count) in totals.items():
+        if count:
+            print(f"{name}: {seconds / count * 1000:.0f} ms/trang, {garbage} ký tự rác trên {count} trang")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_field_extraction import make_document
+from text_normalize import DEFAULT_CORRECTIONS, normalize_text
+
+# So sánh normalize_text với clean_text cũ (14 lần str.replace rồi re.sub từng dòng).
+# Kết quả phải giống nhau, trừ chỗ sửa lỗi "năm 2xxx" có chủ ý, trên văn bản giả lập
+# và trên các chuỗi ngẫu nhiên ghép từ khoá sửa lỗi và khoảng trắng; gọi lại trên kết
+# quả (NormalizedText) không được làm đổi văn bản.
+#
+#   python benchmarks/bench_text_normalize.py [số văn bản] [số trang mỗi văn bản]
+
+LEGACY_CORRECTIONS = {wrong: right for wrong, right in DEFAULT_CORRECTIONS.items() if wrong != "năm 2"}
+FUZZ_PIECES = list(DEFAULT_CORRECTIONS) + [" ", "  ", "\n", "\t", "\r", "\xa0", "a", "2", ".", "m", "tháng", "năm"]
+
+
+def legacy_clean_text(text):
+    for wrong, right in LEGACY_CORRECTIONS.items():
+        text = text.replace(wrong, right)
+    lines = text.split("\n")
+    cleaned_lines = [re.sub(r"\s+", " ", line).strip() for line in lines if line.strip()]
+    return "\n".join(cleaned_lines).strip()
+
+
+# Thêm các lỗi OCR thường gặp vào văn bản giả lập
+def add_ocr_noise(rng, text):
+    text = text.replace(" m²", rng.choice([" m°", " m 2", " m²"]))
+    text = text.replace(": ", rng.choice([": ", ":  ", ":\t"]))
+    text = text.replace("năm 2", "năm 1")  # tránh trường hợp "năm 2xxx" đã đổi cách xử lý
+    return text + "\n \n"
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = random.Random(42)
+    documents = [add_ocr_noise(rng, make_document(rng, pages)) for _ in range(count)]
+
+    fuzz = ["".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randrange(1, 12))) for _ in range(count * 100)]
+    fuzz = [text for text in fuzz if "năm 2" not in text]
+    for text in documents + fuzz:
+        normalized = normalize_text(text)
+        assert normalized == legacy_clean_text(text), repr(text)
+        assert normalize_text(normalized) == normalized, repr(text)
+    print(f"Kết quả giống clean_text cũ và không đổi khi gọi lại trên {count} văn bản ({pages} trang/văn bản) "
+          f"và {len(fuzz)} chuỗi ngẫu nhiên")
+
+    new_time = min(timeit.repeat(lambda: [normalize_text(text) for text in documents], number=1, repeat=15))
+    old_time = min(timeit.repeat(lambda: [legacy_clean_text(text) for text in documents], number=1, repeat=15))
+    print(f"clean_text: cũ {old_time * 1000:.1f} ms, mới {new_time * 1000:.1f} ms, nhanh hơn {old_time / new_time:.2f} lần")
+
+    # Gọi lần hai trên văn bản đã chuẩn hoá: trả về ngay
+    cleaned = [normalize_text(text) for text in documents]
+    again_time = min(timeit.repeat(lambda: [normalize_text(text) for text in cleaned], number=1, repeat=15))
+    print(f"gọi lại trên văn bản đã chuẩn hoá: {again_time * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
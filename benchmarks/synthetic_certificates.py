@@ -0,0 +1,157 @@
+import json
+import os
+import random
+import textwrap
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Sinh giấy chứng nhận giả lập dạng bản scan (PDF chỉ có ảnh, không có lớp text)
+# với các giá trị trường đã biết trước để đo độ chính xác trích xuất. Cùng seed
+# thì sinh ra cùng bộ dữ liệu.
+BENCH_FONT = os.environ.get("BENCH_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+PAGE_SIZE_INCH = (8.27, 11.69)  # A4
+FONT_SIZE_PT = 11
+MARGIN_INCH = 0.8
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Vũ", "Đặng", "Bùi"]
+TEN = ["Văn An", "Thị Bình", "Minh Châu", "Đức Dũng", "Thị Hoa", "Quang Huy"]
+XA = ["xã Tân Lập", "phường Quang Trung", "thị trấn Phú Xuyên", "xã Đông Hòa"]
+LOAI_DAT = ["Đất ở tại nông thôn", "Đất trồng lúa", "Đất ở tại đô thị"]
+HEADER = [
+    "CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM",
+    "Độc lập - Tự do - Hạnh phúc",
+    "GIẤY CHỨNG NHẬN",
+    "QUYỀN SỬ DỤNG ĐẤT, QUYỀN SỞ HỮU NHÀ Ở VÀ TÀI SẢN KHÁC GẮN LIỀN VỚI ĐẤT",
+]
+
+
+# Giá trị các trường của một giấy chứng nhận, cùng tên cột với sheet ThongTinDat
+def make_record(rng):
+    owners = []
+    for _ in range(rng.randint(1, 2)):
+        owners.append({
+            "title": rng.choice(["Ông", "Bà"]),
+            "name": f"{rng.choice(HO)} {rng.choice(TEN)}",
+            "cccd": "".join(rng.choice("0123456789") for _ in range(12)),
+        })
+    xa = rng.choice(XA)
+    return {
+        "owners": owners,
+        "thua": str(rng.randint(1, 999)),
+        "to": str(rng.randint(1, 99)),
+        "dien_tich": f"{rng.randint(50, 5000)}.{rng.randint(0, 9)}",
+        "dia_chi": f"thôn {rng.randint(1, 9)}, {xa}, huyện Phú Xuyên",
+        "xa": xa,
+        "loai_dat": rng.choice(LOAI_DAT),
+        "so_phat_hanh": f"{rng.choice(['CX', 'DA', 'BV'])} {rng.randint(100000, 999999)}",
+        "ngay": f"ngày {rng.randint(1, 28)} tháng {rng.randint(1, 12)} năm {rng.randint(1995, 2024)}",
+    }
+
+
+# Kết quả đúng theo định dạng của extract_land_info_for_excel (+ CCCD người đầu tiên)
+def expected_fields(record):
+    return {
+        "Chủ sở hữu": record["owners"][0]["name"],
+        "Thửa": record["thua"],
+        "Tờ": record["to"],
+        "Diện tích": record["dien_tich"],
+        "Xã": record["xa"].title(),
+        "Số phát hành": record["so_phat_hanh"],
+        "CCCD": record["owners"][0]["cccd"],
+    }
+
+
+# Nội dung từng trang: trang 1 người sử dụng đất, trang 2 thửa đất và số phát hành
+def record_pages(record, pages=2):
+    owner_lines = [
+        f"{owner['title']}: {owner['name']}, CCCD số: {owner['cccd']}."
+        for owner in record["owners"]
+    ]
+    parcel_lines = [
+        "II. Thửa đất, nhà ở và tài sản khác gắn liền với đất",
+        f"Thửa đất số: {record['thua']}, tờ bản đồ số: {record['to']}",
+        f"Địa chỉ: {record['dia_chi']}",
+        f"Diện tích: {record['dien_tich']} m²",
+        f"Loại đất: {record['loai_dat']}.",
+        "Hình thức sử dụng đất: Sử dụng riêng",
+        "Thời hạn: Lâu dài.",
+        "Nguồn gốc sử dụng: Nhà nước giao đất có thu tiền sử dụng đất",
+        f"Phú Xuyên, {record['ngay']}",
+        "CHI NHÁNH VĂN PHÒNG ĐĂNG KÝ ĐẤT ĐAI",
+        record["so_phat_hanh"],
+    ]
+    first = HEADER + ["I. Người sử dụng đất, chủ sở hữu nhà ở và tài sản khác gắn liền với đất"] + owner_lines
+    if pages <= 1:
+        return [first + parcel_lines]
+    # Các trang thêm là trang "Những thay đổi sau khi cấp giấy chứng nhận" để trống
+    changes = ["III. Những thay đổi sau khi cấp giấy chứng nhận", "Nội dung thay đổi và cơ sở pháp lý"]
+    return [first, parcel_lines] + [changes] * (pages - 2)
+
+
+def _wrap(lines, font, max_width):
+    wrapped = []
+    for line in lines:
+        width = max(20, int(len(line) * max_width / max(1, font.getlength(line))))
+        wrapped.extend(textwrap.wrap(line, width) or [""])
+    return wrapped
+
+
+# Vẽ một trang rồi thêm nhiễu như bản scan: nghiêng nhẹ, mờ, chấm nhiễu, dấu mộc đỏ
+def render_page(lines, rng, dpi=200, noise=True, stamp=False):
+    width, height = int(PAGE_SIZE_INCH[0] * dpi), int(PAGE_SIZE_INCH[1] * dpi)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.truetype(BENCH_FONT, int(FONT_SIZE_PT * dpi / 72))
+    margin = int(MARGIN_INCH * dpi)
+    line_height = int(font.size * 1.6)
+    y = margin
+    for line in _wrap(lines, font, width - 2 * margin):
+        draw.text((margin, y), line, fill="black", font=font)
+        y += line_height
+    if stamp:
+        cx, cy, r = width * 2 // 3, y - line_height, int(0.6 * dpi)
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), outline=(200, 30, 30), width=max(2, dpi // 40))
+    if noise:
+        for _ in range(width * height // 2000):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.point((x, y), fill=rng.choice(["black", "gray"]))
+        img = img.rotate(rng.uniform(-1.5, 1.5), resample=Image.BICUBIC, fillcolor="white")
+        img = img.filter(ImageFilter.GaussianBlur(0.6))
+    return img
+
+
+# Ghi một giấy chứng nhận thành PDF ảnh
+def write_certificate(path, record, rng, pages=2, dpi=200, noise=True):
+    contents = record_pages(record, pages)
+    stamp_page = min(1, len(contents) - 1)  # trang có "CHI NHÁNH" và số phát hành
+    images = [
+        render_page(lines, rng, dpi, noise, stamp=index == stamp_page)
+        for index, lines in enumerate(contents)
+    ]
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    for img in images:
+        img.close()
+
+
+# Sinh (hoặc dùng lại nếu đã có) bộ dữ liệu trong data_dir; trả về danh sách
+# (đường dẫn PDF, kết quả đúng). ground_truth.json ghi lại tham số sinh dữ liệu.
+def generate_dataset(data_dir, count=20, pages=2, seed=42, dpi=200, noise=True):
+    params = {"count": count, "pages": pages, "seed": seed, "dpi": dpi, "noise": noise}
+    truth_path = os.path.join(data_dir, "ground_truth.json")
+    if os.path.exists(truth_path):
+        with open(truth_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved["params"] == params and all(os.path.exists(item["path"]) for item in saved["items"]):
+            return [(item["path"], item["expected"]) for item in saved["items"]]
+
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        record = make_record(rng)
+        path = os.path.join(data_dir, f"gcn_{index:04d}.pdf")
+        write_certificate(path, record, rng, pages, dpi, noise)
+        items.append({"path": path, "expected": expected_fields(record)})
+    with open(truth_path, "w", encoding="utf-8") as f:
+        json.dump({"params": params, "items": items}, f, ensure_ascii=False, indent=2)
+    return [(item["path"], item["expected"]) for item in items]
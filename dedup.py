@@ -0,0 +1,97 @@
+import hashlib
+import os
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+# Phát hiện file và trang trùng lặp trước khi OCR.
+#
+# Trùng chính xác (dùng lại kết quả OCR): file giống hệt nhau theo hash SHA-256
+# nội dung; trang giống hệt nhau theo hash dữ liệu ảnh và lệnh vẽ của trang
+# (cùng một trang scan được ghép vào nhiều hồ sơ khác nhau).
+#
+# Gần giống (chỉ là ứng viên, vẫn OCR): bản scan lại hoặc bản nén lại của cùng
+# giấy chứng nhận, nhận ra qua hash cảm quan của ảnh thu nhỏ từng trang: ảnh xám
+# (DEDUP_HASH_SIZE + 1) x DEDUP_HASH_SIZE, mỗi ô có hai bit cho biết ô bên phải
+# sáng hơn / tối hơn ô bên trái quá DEDUP_EDGE mức xám (dHash có vùng chết để vùng
+# giấy trắng không sinh bit ngẫu nhiên theo nhiễu scan). Không dùng lại kết quả
+# OCR cho trang gần giống: hai giấy chứng nhận cùng mẫu chỉ khác số thửa có
+# khoảng cách gần như bằng 0, nhỏ hơn cả bản nén JPEG lại của cùng một bản scan.
+DEDUP = os.environ.get("OCR_DEDUP", "1") != "0"
+DEDUP_HASH_SIZE = 64
+DEDUP_THUMB_DPI = 72
+DEDUP_EDGE = 6
+DEDUP_MAX_DISTANCE = float(os.environ.get("OCR_DEDUP_MAX_DISTANCE", 0.12))
+
+
+# Hash nội dung của một trang PDF (trang fitz): dữ liệu ảnh chưa giải nén và lệnh vẽ
+def page_digest(page):
+    h = hashlib.sha256(f"{page.rect}|{page.rotation}|".encode("utf-8"))
+    h.update(page.read_contents())
+    for image in page.get_images(full=True):
+        h.update(page.parent.xref_stream_raw(image[0]) or b"")
+    return h.hexdigest()
+
+
+# Hash cảm quan của một trang PDF (trang fitz), dạng số nguyên 2 x DEDUP_HASH_SIZE² bit
+def page_hash(page, hash_size=DEDUP_HASH_SIZE):
+    zoom = DEDUP_THUMB_DPI / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    thumb = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    pixels = np.asarray(thumb.resize((hash_size + 1, hash_size), Image.BOX), dtype=np.int16)
+    steps = pixels[:, 1:] - pixels[:, :-1]
+    bits = np.concatenate([(steps > DEDUP_EDGE).flatten(), (steps < -DEDUP_EDGE).flatten()])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# Hash cảm quan của tất cả các trang trong file (tài liệu fitz đã mở)
+def document_hashes(doc):
+    return [page_hash(page) for page in doc]
+
+
+# Tỉ lệ bit khác nhau trên số bit cạnh của hai trang (0: giống hệt, 1: khác hẳn)
+def distance(a, b):
+    edges = bin(a | b).count("1")
+    return bin(a ^ b).count("1") / edges if edges else 0.0
+
+
+def is_near(a, b, max_distance=DEDUP_MAX_DISTANCE):
+    return distance(a, b) <= max_distance
+
+
+# Tìm file trùng trong một lô. digests: hash nội dung từng file, page_hashes:
+# danh sách hash cảm quan các trang của từng file. Phần tử i của kết quả là None
+# hoặc (j, "exact" | "near") với j < i là file gốc mà file i trùng với.
+def find_duplicates(digests, page_hashes):
+    duplicates = []
+    first_by_digest = {}
+    originals = []
+    for index, (digest, hashes) in enumerate(zip(digests, page_hashes)):
+        match = None
+        if digest in first_by_digest:
+            match = (first_by_digest[digest], "exact")
+        else:
+            first_by_digest[digest] = index
+            for original in originals:
+                other = page_hashes[original]
+                if len(other) == len(hashes) and all(is_near(a, b) for a, b in zip(hashes, other)):
+                    match = (original, "near")
+                    break
+        duplicates.append(match)
+        if match is None:
+            originals.append(index)
+    return duplicates
+
+
+# Các trang giống hệt một trang đứng trước (trong cùng file hoặc file khác).
+# digests: {khoá trang: page_digest} theo thứ tự; trả về {khoá trang lặp lại: khoá trang gốc}.
+def repeated_pages(digests):
+    aliases = {}
+    first = {}
+    for key, digest in digests.items():
+        if digest in first:
+            aliases[key] = first[digest]
+        else:
+            first[digest] = key
+    return aliases
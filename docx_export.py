@@ -0,0 +1,83 @@
+import os
+import re
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+
+from docxtpl import DocxTemplate
+
+import metrics
+
+# Xuất DOCX từ template hoàn toàn trong bộ nhớ: không ghi file ra đường dẫn cố
+# định nên nhiều phiên Streamlit chạy cùng lúc không ghi đè file của nhau.
+DOCX_TEMPLATE = "template.docx"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MIME = "application/zip"
+
+_UNSAFE_CHARS = re.compile(r"[^\w\-]+")
+
+
+# Nội dung template được đọc một lần cho mỗi tiến trình (đọc lại khi file thay
+# đổi). docxtpl luôn dựng lại tài liệu từ nguồn của template mỗi lần render nên
+# ở đây giữ bytes trong bộ nhớ thay vì đọc lại từ đĩa.
+@lru_cache(maxsize=8)
+def _template_bytes(path, mtime):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_template(template_path=DOCX_TEMPLATE):
+    return DocxTemplate(BytesIO(_template_bytes(template_path, os.stat(template_path).st_mtime)))
+
+
+def build_context(land_info, nguoi_su_dung, new_name=None):
+    context = {**land_info, **nguoi_su_dung}
+    if new_name:
+        context["TenNguoi_1"] = new_name.strip()
+    return context
+
+
+# Điền thông tin vào template, trả về nội dung file DOCX (bytes)
+def render_docx(land_info, nguoi_su_dung, template_path=DOCX_TEMPLATE, new_name=None):
+    with metrics.stage("export_docx"):
+        doc = load_template(template_path)
+        doc.render(build_context(land_info, nguoi_su_dung, new_name))
+        output = BytesIO()
+        doc.save(output)
+        return output.getvalue()
+
+
+# Tên file DOCX theo tên người sử dụng đất đầu tiên (bỏ ký tự không hợp lệ)
+def docx_file_name(nguoi_su_dung, new_name=None, default="nguoi_su_dung"):
+    name = (new_name or nguoi_su_dung.get("TenNguoi_1") or default).strip()
+    name = _UNSAFE_CHARS.sub("_", name).strip("_") or default
+    return f"GCN_{name}.docx"
+
+
+def _unique_name(name, used):
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{stem}_{n}{ext}"
+    used.add(candidate)
+    return candidate
+
+
+# Xuất nhiều DOCX vào một file ZIP. `records` gồm các bộ (tên file, land_info,
+# nguoi_su_dung); mỗi file được render xong là ghi ngay vào ZIP nên bộ nhớ chỉ
+# giữ một tài liệu tại một thời điểm. `output` là đường dẫn hoặc file object.
+def write_docx_zip(records, output, template_path=DOCX_TEMPLATE):
+    used = set()
+    count = 0
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name, land_info, nguoi_su_dung in records:
+            archive.writestr(_unique_name(file_name, used), render_docx(land_info, nguoi_su_dung, template_path))
+            count += 1
+    return count
+
+
+def render_docx_zip(records, template_path=DOCX_TEMPLATE):
+    output = BytesIO()
+    write_docx_zip(records, output, template_path)
+    return output.getvalue()
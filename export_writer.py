@@ -0,0 +1,124 @@
+import csv
+import os
+import tempfile
+
+import xlsxwriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow là tuỳ chọn, chỉ cần khi xuất Parquet
+    pa = pq = None
+
+# Xuất kết quả từng dòng ngay khi mỗi file xử lý xong, không gom cả lô vào một
+# DataFrame rồi mới ghi:
+#   - xlsx: xlsxwriter ở chế độ constant_memory, mỗi dòng được ghi thẳng ra đĩa
+#     nên bộ nhớ không tăng theo số dòng (file chỉ mở được sau khi close_writer).
+#   - csv: UTF-8 có BOM để Excel hiển thị đúng tiếng Việt; flush sau mỗi dòng nên
+#     đọc/tải được bất cứ lúc nào khi lô còn đang chạy (kết quả tạm thời).
+#   - parquet: ghi theo từng nhóm EXPORT_PARQUET_ROW_GROUP dòng (cần pyarrow).
+EXPORT_SHEET = "ThongTinDat"
+EXPORT_PARQUET_ROW_GROUP = int(os.environ.get("OCR_EXPORT_PARQUET_ROW_GROUP", 1000))
+EXPORT_MIMES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+# Các định dạng xuất được trong môi trường hiện tại (Parquet chỉ khi có pyarrow)
+EXPORT_FORMATS = [fmt for fmt in EXPORT_MIMES if fmt != "parquet" or pa is not None]
+
+
+# Định dạng xuất theo phần mở rộng của đường dẫn
+def export_format(path):
+    fmt = os.path.splitext(path)[1].lower().lstrip(".")
+    if fmt == "parquet" and pa is None:
+        raise ValueError("Cần cài pyarrow để xuất Parquet (pip install pyarrow)")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Không hỗ trợ xuất file .{fmt} (chỉ hỗ trợ {', '.join(EXPORT_FORMATS)})")
+    return fmt
+
+
+def _cells(writer, row):
+    return ["" if row.get(column) is None else str(row.get(column)) for column in writer["columns"]]
+
+
+# Mở file xuất với thứ tự cột cố định; cột thiếu trong một dòng để trống, cột thừa bị bỏ qua
+def open_writer(path, columns, fmt=None):
+    fmt = fmt or export_format(path)
+    writer = {"path": path, "format": fmt, "columns": list(columns), "rows": 0}
+    if fmt == "xlsx":
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        sheet = workbook.add_worksheet(EXPORT_SHEET)
+        sheet.write_row(0, 0, writer["columns"])
+        writer.update(workbook=workbook, sheet=sheet)
+    elif fmt == "csv":
+        f = open(path, "w", encoding="utf-8-sig", newline="")
+        writer.update(file=f, csv=csv.writer(f))
+        writer["csv"].writerow(writer["columns"])
+        f.flush()
+    elif fmt == "parquet":
+        if pa is None:
+            raise RuntimeError("Cần cài pyarrow để xuất Parquet (pip install pyarrow)")
+        schema = pa.schema([(column, pa.string()) for column in writer["columns"]])
+        writer.update(parquet=pq.ParquetWriter(path, schema), schema=schema, buffer=[])
+    else:
+        raise ValueError(f"Không hỗ trợ xuất định dạng {fmt} (chỉ hỗ trợ {', '.join(EXPORT_FORMATS)})")
+    return writer
+
+
+def _flush_parquet(writer):
+    if writer["buffer"]:
+        columns = list(zip(*writer["buffer"]))
+        writer["parquet"].write_table(pa.Table.from_arrays([pa.array(c, pa.string()) for c in columns],
+                                                           schema=writer["schema"]))
+        writer["buffer"] = []
+
+
+# Ghi thêm một dòng (dict theo tên cột)
+def write_row(writer, row):
+    cells = _cells(writer, row)
+    writer["rows"] += 1
+    if writer["format"] == "xlsx":
+        writer["sheet"].write_row(writer["rows"], 0, cells)
+    elif writer["format"] == "csv":
+        writer["csv"].writerow(cells)
+        writer["file"].flush()
+    else:
+        writer["buffer"].append(cells)
+        if len(writer["buffer"]) >= EXPORT_PARQUET_ROW_GROUP:
+            _flush_parquet(writer)
+
+
+def close_writer(writer):
+    if writer["format"] == "xlsx":
+        writer["workbook"].close()
+    elif writer["format"] == "csv":
+        writer["file"].close()
+    else:
+        _flush_parquet(writer)
+        writer["parquet"].close()
+    return writer["rows"]
+
+
+# Ghi lần lượt các dòng (list hoặc generator) ra file, trả về số dòng đã ghi
+def write_rows(rows, path, columns, fmt=None):
+    writer = open_writer(path, columns, fmt)
+    try:
+        for row in rows:
+            write_row(writer, row)
+    finally:
+        close_writer(writer)
+    return writer["rows"]
+
+
+# Nội dung file xuất (bytes) cho nút tải về của Streamlit. Ghi qua file tạm vì
+# chế độ constant_memory của xlsxwriter cần ghi ra đĩa.
+def export_bytes(rows, columns, fmt="xlsx"):
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        write_rows(rows, path, columns, fmt)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
@@ -0,0 +1,247 @@
+import re
+from functools import lru_cache
+
+# Bộ trích xuất trường thông tin dùng chung cho tất cả các app.
+# Toàn bộ nhãn được tìm trong MỘT lần quét văn bản; giá trị của từng trường sau
+# đó được cắt ra ngay tại vị trí nhãn bằng các mẫu đã biên dịch sẵn, thay vì
+# chạy 10-15 lần re.search trên cả văn bản như trước.
+
+# Nhóm nhãn -> các chuỗi nhãn (không phân biệt hoa thường khi quét)
+LABELS = {
+    "thua": ("Thửa đất số:",),
+    "to": ("tờ bản đồ số:",),
+    "dien_tich": ("Diện tích:",),
+    "loai_dat": ("Loại đất",),
+    "hinh_thuc": ("Hình thức sử dụng đất",),
+    "dia_chi": ("Địa chỉ",),
+    "nguon_goc": ("Nguồn gốc sử dụng",),
+    "thoi_diem_dang_ky": ("Thời điểm đăng ký vào sổ địa chính",),
+    "so_vao_so": ("Số vào sổ cấp Giấy chứng nhận",),
+    "ghi_chu": ("Ghi chú",),
+    "ngay": ("ngày",),
+    "chi_nhanh": ("CHI NHÁNH",),
+    "nguoi": ("Ông:", "Bà:"),
+}
+
+
+# Nhãn (chữ thường) -> nhóm nhãn
+_LABEL_GROUPS = {label.lower(): name for name, group in LABELS.items() for label in group}
+_MAX_LABEL_LEN = max(len(label) for label in _LABEL_GROUPS)
+
+
+# Nhãn có phần cuối trùng với phần đầu của một nhãn khác (ví dụ "loại đất" và
+# "thửa đất số:" chung chữ "t"). Sau khi gặp các nhãn này cần kiểm tra thêm các
+# vị trí bên trong đoạn vừa khớp để không bỏ sót nhãn chồng lấn.
+# Kết quả: nhãn -> danh sách (độ lệch, nhãn khác) theo độ lệch tăng dần.
+def _overlapping_labels(labels):
+    overlapping = {}
+    for a in labels:
+        for k in range(1, len(a)):
+            for b in labels:
+                if b.startswith(a[k:]) or a[k:].startswith(b):
+                    overlapping.setdefault(a, []).append((k, b))
+    return overlapping
+
+
+_OVERLAPPING = _overlapping_labels(_LABEL_GROUPS)
+
+
+# Biểu thức quét cho một tập nhóm nhãn. Văn bản được đổi sang chữ thường một lần
+# rồi quét bằng biểu thức phân biệt hoa thường (nhanh hơn nhiều so với IGNORECASE).
+# Nhãn dài đặt trước để nhãn là phần đầu của nhãn khác không che mất nhãn dài.
+@lru_cache(maxsize=None)
+def _label_scanner(groups):
+    labels = sorted((label for label, name in _LABEL_GROUPS.items() if name in groups), key=len, reverse=True)
+    pattern = "|".join(re.escape(label) for label in labels)
+    return re.compile(pattern), re.compile(pattern, re.IGNORECASE)
+
+
+_SERIAL = re.compile(r"\b([A-Z]{2}\s*\d{6,})\b")
+_SPACES = re.compile(r"\s+")
+_DATE = re.compile(r"ngày\s*(\d{1,2})\s*tháng\s*(\d{1,2})\s*năm\s*(\d{4})")
+_XA = re.compile(r"(xã|phường|thị trấn)\s+[^\-,\n]+", re.IGNORECASE)
+
+
+def normalize_vietnamese_date(text):
+    text = text.lower()
+    text = _SPACES.sub(" ", text).strip()
+    match = _DATE.search(text)
+    if match:
+        day, month, year = match.groups()
+        return f"{int(day):02}/{int(month):02}/{year}"
+    return ""
+
+
+def extract_xa_from_diachi(dia_chi):
+    match = _XA.search(dia_chi)
+    return match.group(0).strip().title() if match else ""
+
+
+def _value(match):
+    return match.group(1).strip()
+
+
+def _loai_dat(match):
+    return match.group(1).strip(";: \n")
+
+
+def _date(match):
+    return normalize_vietnamese_date(match.group(1))
+
+
+# Số phát hành GCN nằm trong khoảng 300 ký tự sau "CHI NHÁNH"
+def _serial(match):
+    serial = _SERIAL.search(match.group(0))
+    return serial.group(1).strip() if serial else ""
+
+
+def _line(label):
+    # Giá trị là phần còn lại của dòng (như extract_clean_field cũ)
+    return re.compile(rf"{re.escape(label)}[:\-]?\s*([^\n]*)", re.IGNORECASE)
+
+
+def _until_dot(label):
+    # Giá trị kéo dài (có thể qua nhiều dòng) tới dấu chấm đầu tiên
+    return re.compile(rf"{re.escape(label)}[:\-]?\s*([^.]*)(?=\.)", re.IGNORECASE)
+
+
+# Bảng khai báo các trường: (khoá, nhóm nhãn, mẫu khớp tại vị trí nhãn, hàm lấy giá trị)
+FIELD_SPECS = [
+    ("SoThua", "thua", re.compile(r"Thửa đất số:\s*(\d+)", re.IGNORECASE), _value),
+    ("SoToBanDo", "to", re.compile(r"tờ bản đồ số:\s*(\d+)", re.IGNORECASE), _value),
+    ("DienTich", "dien_tich", re.compile(r"Diện tích:\s*([\d.,]+)\s*m²?", re.IGNORECASE), _value),
+    ("LoaiDat", "loai_dat", _until_dot("Loại đất"), _loai_dat),
+    ("HinhThucSuDung", "hinh_thuc", _line("Hình thức sử dụng đất"), _value),
+    ("DiaChi", "dia_chi", _line("Địa chỉ"), _value),
+    # Giữ nguyên cách lấy như trước: Thời hạn đang dùng chung mẫu với Loại đất
+    ("ThoiHanSuDung", "loai_dat", _until_dot("Loại đất"), _loai_dat),
+    ("NguonGocSuDung", "nguon_goc", _line("Nguồn gốc sử dụng"), _value),
+    ("ThoiDiemDangKy", "thoi_diem_dang_ky", _line("Thời điểm đăng ký vào sổ địa chính"), _value),
+    ("SoPhatHanhGCN", "chi_nhanh", re.compile(r"CHI NHÁNH[\s\S]{0,300}", re.IGNORECASE), _serial),
+    ("SoVaoSoCapGCN", "so_vao_so", _line("Số vào sổ cấp Giấy chứng nhận"), _value),
+    ("ThoiDiemDangKyGCN", "ngay", re.compile(r"(ngày\s*\d{0,2}[\s\S]{0,60}năm\s*\d{4})", re.IGNORECASE), _date),
+    ("NoiDung", "ghi_chu", _until_dot("Ghi chú"), _value),
+    # Tên chủ sở hữu cho bảng Excel (người đầu tiên, không cần địa chỉ)
+    ("ChuSoHuu", "nguoi", re.compile(r"(?:Ông|Bà):\s*([^\n,]+?),\s*CCCD số:\s*(\d+)"), _value),
+]
+
+LAND_INFO_KEYS = [
+    "SoThua", "SoToBanDo", "DienTich", "LoaiDat", "HinhThucSuDung", "DiaChi", "ThoiHanSuDung",
+    "NguonGocSuDung", "ThoiDiemDangKy", "SoPhatHanhGCN", "SoVaoSoCapGCN", "ThoiDiemDangKyGCN", "NoiDung",
+]
+
+EXCEL_KEYS = ["ChuSoHuu", "SoThua", "SoToBanDo", "DienTich", "DiaChi", "SoPhatHanhGCN"]
+
+OWNER_PATTERN = re.compile(r"(?:Ông|Bà):\s*([^\n,]+?),\s*CCCD số:\s*(\d+)(?:,\s*Địa chỉ:\s*([\s\S]*?))?\.")
+
+
+# Quét nhãn theo từng đoạn (đổi sang chữ thường từng đoạn một), sinh ra (nhóm nhãn,
+# vị trí) theo thứ tự tăng dần. `groups` được đọc lại ở đầu mỗi đoạn nên người gọi
+# có thể bỏ bớt các nhóm đã đủ giá trị; khi không còn nhóm nào thì dừng quét, phần
+# còn lại của văn bản không cần đổi chữ thường hay quét nữa.
+SCAN_CHUNK = 1024
+
+
+def iter_labels(text, groups=None):
+    groups = LABELS if groups is None else groups
+    scanned = None
+    for start in range(0, len(text), SCAN_CHUNK):
+        if not groups:
+            return
+        # Người gọi chỉ bỏ bớt nhóm nên số nhóm không đổi thì biểu thức quét vẫn đúng
+        if len(groups) != scanned:
+            scanner, scanner_ignorecase = _label_scanner(frozenset(groups))
+            scanned = len(groups)
+        limit = min(SCAN_CHUNK, len(text) - start)  # chỉ nhận nhãn bắt đầu trong đoạn này
+        chunk = text[start:start + SCAN_CHUNK + 2 * _MAX_LABEL_LEN]
+        lowered = chunk.lower()
+        if len(lowered) != len(chunk):
+            # Hiếm gặp: chữ thường làm đổi độ dài chuỗi nên vị trí không còn khớp
+            scanner, lowered = scanner_ignorecase, chunk
+        for match in scanner.finditer(lowered):
+            pos = match.start()
+            if pos >= limit:
+                break
+            label = match.group().lower()
+            yield _LABEL_GROUPS[label], start + pos
+            for offset, other in _OVERLAPPING.get(label, ()):
+                if (pos + offset < limit and _LABEL_GROUPS[other] in groups
+                        and lowered.startswith(other, pos + offset)):
+                    yield _LABEL_GROUPS[other], start + pos + offset
+
+
+# Vị trí (theo thứ tự) của từng nhóm nhãn trong cả văn bản
+def scan_labels(text, groups=None):
+    positions = {}
+    for group, pos in iter_labels(text, groups):
+        positions.setdefault(group, []).append(pos)
+    return positions
+
+
+# Tên các trường cần lấy và mẫu của chúng gom theo nhóm nhãn; chỉ tính một lần cho
+# mỗi tập trường (LAND_INFO_KEYS, EXCEL_KEYS) thay vì ở mỗi lần gọi
+@lru_cache(maxsize=None)
+def _field_plan(keys):
+    specs = FIELD_SPECS if keys is None else [spec for spec in FIELD_SPECS if spec[0] in keys]
+    plan = {}
+    for spec in specs:
+        plan.setdefault(spec[1], []).append(spec)
+    return [spec[0] for spec in specs], plan
+
+
+# Trích xuất các trường (mặc định tất cả) trong một lần quét nhãn. Mỗi vị trí nhãn
+# được thử ngay với mẫu của các trường chưa có giá trị (tương đương re.search: lấy
+# vị trí khớp đầu tiên); quét dừng khi mọi trường đã có giá trị.
+def extract_fields(text, keys=None, with_owners=True):
+    names, plan = _field_plan(None if keys is None else tuple(keys))
+    pending = {group: list(specs) for group, specs in plan.items()}
+    fields = dict.fromkeys(names, "")
+    for group, pos in iter_labels(text, pending):
+        group_specs = pending.get(group)
+        if not group_specs:
+            continue
+        for spec in list(group_specs):
+            key, _, pattern, get_value = spec
+            match = pattern.match(text, pos)
+            if match:
+                fields[key] = get_value(match)
+                group_specs.remove(spec)
+        if not group_specs:
+            del pending[group]
+            if not pending:
+                break
+    # Người sử dụng đất có thể lặp lại nhiều lần nên luôn quét hết văn bản
+    owners = [match.groups() for match in OWNER_PATTERN.finditer(text)] if with_owners else []
+    return fields, owners
+
+
+def owners_to_context(owners):
+    nguoi_su_dung = {}
+    for i, (ten, cccd, dia_chi) in enumerate(owners, start=1):
+        nguoi_su_dung[f"TenNguoi_{i}"] = ten.strip()
+        nguoi_su_dung[f"SoCCCD_{i}"] = cccd.strip()
+        nguoi_su_dung[f"DiaChiNguoi_{i}"] = dia_chi.strip() if dia_chi else ""
+    return nguoi_su_dung
+
+
+def fields_to_excel_row(fields):
+    return {
+        "Chủ sở hữu": fields["ChuSoHuu"],
+        "Thửa": fields["SoThua"],
+        "Tờ": fields["SoToBanDo"],
+        "Diện tích": fields["DienTich"],
+        "Xã": extract_xa_from_diachi(fields["DiaChi"]),
+        "Số phát hành": fields["SoPhatHanhGCN"],
+    }
+
+
+# Thông tin thửa đất (cho template DOCX) và người sử dụng đất
+def extract_land_info(text):
+    fields, owners = extract_fields(text, LAND_INFO_KEYS)
+    return {key: fields[key] for key in LAND_INFO_KEYS}, owners_to_context(owners)
+
+
+# Một dòng của sheet ThongTinDat
+def extract_land_info_for_excel(text):
+    fields, _ = extract_fields(text, EXCEL_KEYS, with_owners=False)
+    return fields_to_excel_row(fields)
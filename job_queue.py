@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+from land_info import clean_text, extract_land_info_for_excel, extract_text_from_scanned_pdf
+from ocr_engine import OCR_WORKERS, get_ocr_pool, iter_pages, join_pages, open_pdf, read_pdf_bytes
+from ocr_cache import content_hash
+from parcel_store import save_result
+
+# Hàng đợi xử lý nền cho giao diện Streamlit. File upload được lưu xuống đĩa,
+# trạng thái job và tiến độ từng trang nằm trong SQLite nên tải lại trang (hoặc
+# mất kết nối) vẫn xem tiếp được; giao diện chỉ việc đọc lại trạng thái định kỳ.
+#
+# Mỗi file được OCR tuần tự trong một tiến trình của pool OCR dùng chung, nên số
+# lần chạy Tesseract đồng thời không vượt quá số tiến trình của pool dù có bao
+# nhiêu người dùng. Số file đang chờ/chạy bị giới hạn bởi JOB_QUEUE_MAX: vượt
+# quá thì submit_job báo QueueFull để người dùng thử lại sau; lô có nhiều file hơn
+# JOB_QUEUE_MAX thì không bao giờ nhận được nên bị từ chối kèm giới hạn.
+#
+# Tiến độ theo trang (pages_done) chỉ có ở chế độ trong PAGE_PROGRESS_MODES; chế độ
+# roi và adaptive dừng sớm hoặc OCR lại từng vùng nên chỉ báo tiến độ theo file.
+JOB_DIR = os.environ.get("OCR_JOB_DIR", ".ocr_jobs")
+JOB_DB = os.path.join(JOB_DIR, "jobs.sqlite")
+JOB_QUEUE_MAX = int(os.environ.get("OCR_JOB_QUEUE_MAX", OCR_WORKERS * 4))
+JOB_RETENTION_HOURS = float(os.environ.get("OCR_JOB_RETENTION_HOURS", 24))
+
+FINISHED = ("ok", "error")
+PAGE_PROGRESS_MODES = ("full",)
+
+_lock = threading.Lock()
+_resumed = False
+
+
+class QueueFull(Exception):
+    pass
+
+
+def connect(db_path=None):
+    conn = sqlite3.connect(db_path or JOB_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db(db_path=None):
+    os.makedirs(JOB_DIR, exist_ok=True)
+    with connect(db_path) as conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                mode TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                pages_total INTEGER NOT NULL DEFAULT 0,
+                pages_done INTEGER NOT NULL DEFAULT 0,
+                text TEXT,
+                row TEXT,
+                error TEXT,
+                seconds REAL,
+                metrics TEXT,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS job_files_status ON job_files (status);
+        """)
+        # CSDL tạo từ phiên bản trước chưa có cột metrics
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(job_files)")]
+        if "metrics" not in columns:
+            conn.execute("ALTER TABLE job_files ADD COLUMN metrics TEXT")
+
+
+def _update_file(conn, job_id, index, **values):
+    columns = ", ".join(f"{column} = ?" for column in values)
+    conn.execute(f"UPDATE job_files SET {columns} WHERE job_id = ? AND idx = ?", (*values.values(), job_id, index))
+    conn.commit()
+
+
+# Chạy trong tiến trình của pool: OCR một file, ghi tiến độ sau mỗi trang.
+# Trả về thời gian từng bước (metrics.py) để tiến trình cha ghi log/bộ đếm.
+def run_job_file(db_path, job_id, index, path, mode, name=None):
+    started = time.time()
+    conn = connect(db_path)
+    try:
+        with metrics.capture(name or path) as record:
+            try:
+                with open_pdf(path) as doc:
+                    _update_file(conn, job_id, index, status="running", pages_total=doc.page_count)
+                if mode not in PAGE_PROGRESS_MODES:
+                    text = extract_text_from_scanned_pdf(path, workers=1, mode=mode)
+                else:
+                    pages = []
+                    for page in iter_pages(path):
+                        pages.append(page)
+                        _update_file(conn, job_id, index, pages_done=len(pages))
+                    text = clean_text(join_pages(pages))
+                row = extract_land_info_for_excel(text)
+                save_result(name or os.path.basename(path), text, row=row, source_hash=content_hash(path))
+                values = {"status": "ok", "text": text, "row": json.dumps(row, ensure_ascii=False)}
+            except Exception as e:
+                values = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        summary = record["summary"]
+        _update_file(conn, job_id, index, **values, seconds=round(time.time() - started, 3),
+                     metrics=json.dumps(summary, ensure_ascii=False))
+        return summary
+    finally:
+        conn.close()
+
+
+# Ghi log thời gian từng bước; tiến trình con chết giữa chừng (BrokenProcessPool...)
+# thì không tự ghi được lỗi
+def _on_done(job_id, index):
+    def callback(future):
+        error = future.exception()
+        if error is None:
+            metrics.publish(future.result())
+            return
+        with connect() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = 'error', error = ? WHERE job_id = ? AND idx = ? AND status NOT IN (?, ?)",
+                (f"{type(error).__name__}: {error}", job_id, index, *FINISHED),
+            )
+    return callback
+
+
+def _dispatch(job_id, index, path, mode, name=None):
+    future = get_ocr_pool().submit(run_job_file, JOB_DB, job_id, index, path, mode, name)
+    future.add_done_callback(_on_done(job_id, index))
+
+
+# Gửi lại các file chưa xong khi tiến trình Streamlit khởi động lại
+def resume_jobs():
+    global _resumed
+    with _lock:
+        if _resumed:
+            return
+        _resumed = True
+        init_db()
+        with connect() as conn:
+            rows = conn.execute(
+                "SELECT f.job_id, f.idx, f.name, f.path, j.mode FROM job_files f JOIN jobs j ON j.id = f.job_id "
+                "WHERE f.status NOT IN (?, ?) ORDER BY j.created, f.idx", FINISHED
+            ).fetchall()
+            conn.execute("UPDATE job_files SET status = 'queued', pages_done = 0 WHERE status = 'running'")
+        for row in rows:
+            _dispatch(row["job_id"], row["idx"], row["path"], row["mode"], row["name"])
+
+
+# Số file đang chờ hoặc đang chạy của tất cả các job
+def queue_depth(conn):
+    return conn.execute("SELECT COUNT(*) FROM job_files WHERE status NOT IN (?, ?)", FINISHED).fetchone()[0]
+
+
+# Xoá các job đã cũ cùng file upload của chúng
+def purge_jobs(conn, max_age_hours=JOB_RETENTION_HOURS):
+    cutoff = time.time() - max_age_hours * 3600
+    old = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE created < ?", (cutoff,))]
+    for job_id in old:
+        conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(os.path.join(JOB_DIR, job_id), ignore_errors=True)
+
+
+# Tạo job cho các file upload; trả về mã job. Báo QueueFull nếu hàng đợi đã đầy
+# hoặc lô lớn hơn JOB_QUEUE_MAX.
+def submit_job(uploaded_files, mode="full"):
+    if len(uploaded_files) > JOB_QUEUE_MAX:
+        raise QueueFull(f"Lô có {len(uploaded_files)} file, mỗi lần chạy nền chỉ nhận tối đa {JOB_QUEUE_MAX} file; "
+                        "hãy chia thành các lô nhỏ hơn")
+    resume_jobs()
+    job_id = uuid.uuid4().hex
+    with _lock:
+        with connect() as conn:
+            purge_jobs(conn)
+            depth = queue_depth(conn)
+            if depth + len(uploaded_files) > JOB_QUEUE_MAX:
+                raise QueueFull(f"Hàng đợi đang có {depth} file (tối đa {JOB_QUEUE_MAX}), vui lòng thử lại sau")
+            job_dir = os.path.join(JOB_DIR, job_id)
+            os.makedirs(job_dir)
+            files = []
+            for index, uploaded_file in enumerate(uploaded_files):
+                path = os.path.join(job_dir, f"{index}.pdf")
+                with open(path, "wb") as f:
+                    f.write(read_pdf_bytes(uploaded_file))
+                files.append((job_id, index, getattr(uploaded_file, "name", f"{index}.pdf"), path))
+            conn.execute("INSERT INTO jobs (id, mode, created) VALUES (?, ?, ?)", (job_id, mode, time.time()))
+            conn.executemany("INSERT INTO job_files (job_id, idx, name, path) VALUES (?, ?, ?, ?)", files)
+    for _, index, name, path in files:
+        _dispatch(job_id, index, path, mode, name)
+    return job_id
+
+
+# Trạng thái job: None nếu không tồn tại (hoặc đã bị xoá), ngược lại gồm "done"
+# (tất cả file đã xong) và danh sách file với tiến độ, kết quả từng file. Text
+# OCR chỉ được đọc khi with_text=True (giao diện đọc trạng thái mỗi giây).
+def get_job(job_id, with_text=False):
+    resume_jobs()
+    with connect() as conn:
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        columns = "*" if with_text else "name, status, pages_total, pages_done, NULL AS text, row, error, seconds, metrics"
+        rows = conn.execute(f"SELECT {columns} FROM job_files WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+    files = []
+    for row in rows:
+        files.append({
+            "name": row["name"],
+            "status": row["status"],
+            "pages_total": row["pages_total"],
+            "pages_done": row["pages_done"],
+            "text": row["text"],
+            "row": json.loads(row["row"]) if row["row"] else None,
+            "error": row["error"],
+            "seconds": row["seconds"],
+            "metrics": json.loads(row["metrics"]) if row["metrics"] else None,
+        })
+    return {
+        "id": job["id"],
+        "mode": job["mode"],
+        "created": job["created"],
+        "done": all(f["status"] in FINISHED for f in files),
+        "files": files,
+    }
@@ -0,0 +1,132 @@
+import dedup
+from adaptive_ocr import extract_adaptive_text
+import field_extraction
+import metrics
+from ocr_cache import content_hash
+from ocr_engine import extract_documents, extract_pages, get_ocr_pool, join_pages, open_pdf, pdf_source, read_pdf_bytes
+from roi_ocr import OCR_LAYOUT_TEMPLATE, extract_roi_text
+from text_normalize import normalize_text
+
+# Các hàm OCR và trích xuất thông tin dùng chung cho các app Streamlit và chạy
+# hàng loạt từ dòng lệnh (batch_cli.py)
+
+
+# Sửa lỗi OCR và chuẩn hoá khoảng trắng (xem text_normalize.py). Văn bản đã chuẩn
+# hoá được đánh dấu nên gọi lại lần nữa không tốn thêm chi phí và không đổi giá trị.
+def clean_text(text):
+    with metrics.stage("clean_text"):
+        return normalize_text(text)
+
+
+# Các trường phải có để dừng OCR sớm ở chế độ theo vùng (roi) và để OCR lại ở
+# chế độ thích nghi (adaptive)
+REQUIRED_FIELDS = ["Chủ sở hữu", "Thửa", "Tờ", "Diện tích", "Số phát hành"]
+
+# Các chế độ OCR: "full" OCR cả trang; "roi" chỉ OCR các vùng chứa nhãn cần thiết;
+# "adaptive" OCR nhanh ở DPI thấp rồi chỉ OCR lại ở DPI cao vùng có trường thiếu
+# hoặc độ tin cậy thấp (xem adaptive_ocr.py)
+OCR_MODES = ["full", "roi", "adaptive"]
+
+
+def missing_land_fields(text):
+    info = field_extraction.extract_land_info_for_excel(normalize_text(text))
+    return [field for field in REQUIRED_FIELDS if not info[field]]
+
+
+def is_land_info_complete(text):
+    return not missing_land_fields(text)
+
+
+def extract_text_from_scanned_pdf(pdf_bytes, workers=None, mode="full"):
+    if mode == "roi":
+        return clean_text(extract_roi_text(pdf_bytes, is_complete=is_land_info_complete,
+                                           template=OCR_LAYOUT_TEMPLATE))
+    if mode == "adaptive":
+        return clean_text(extract_adaptive_text(pdf_bytes, missing_fields=missing_land_fields))
+    # Trang có lớp text dùng trực tiếp, chỉ các trang ảnh mới phải OCR
+    extracted_text = join_pages(extract_pages(pdf_bytes, workers=workers))
+    return clean_text(extracted_text)
+
+
+# Chạy trong tiến trình của pool: OCR một file theo chế độ `mode`, trả về text và thời gian từng bước
+def _file_text_task(pdf_bytes, mode):
+    with metrics.capture() as record:
+        text = extract_text_from_scanned_pdf(pdf_bytes, 1, mode)
+    return text, record["summary"]
+
+
+# OCR song song tất cả các file: các trang của mọi file dùng chung một pool tiến trình
+# (chế độ roi và adaptive xử lý từng file trong một tiến trình vì cần xem các trường
+# đã trích xuất được sau mỗi bước). `records`: record đo thời gian (metrics.py) của từng file, nếu cần.
+def extract_texts_from_scanned_pdfs(uploaded_files, mode="full", records=None):
+    records = records or [metrics.current()] * len(uploaded_files)
+    if mode in ("roi", "adaptive"):
+        pool = get_ocr_pool()
+        futures = [pool.submit(_file_text_task, read_pdf_bytes(f), mode) for f in uploaded_files]
+        texts = []
+        for future, record in zip(futures, records):
+            text, summary = future.result()
+            metrics.merge(record, summary)
+            texts.append(text)
+        return texts
+    documents = extract_documents(uploaded_files, records=records)
+    texts = []
+    for pages, record in zip(documents, records):
+        with metrics.active(record):
+            texts.append(clean_text(join_pages(pages)))
+    return texts
+
+
+# Định danh một lần upload: Streamlit cấp file_id mới mỗi lần chọn file
+def upload_id(uploaded_file):
+    return getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+
+
+# Hash nội dung file upload (khoá của cache OCR, dùng làm khoá dự phòng của kho kết quả)
+def upload_hash(uploaded_file):
+    return content_hash(pdf_source(uploaded_file))
+
+
+# Tìm các file trùng nhau trong lô upload: giống hệt (cùng hash nội dung) hoặc bản
+# scan lại gần giống từng trang (xem dedup.py). Phần tử i của kết quả là None hoặc
+# (j, "exact" | "near") với j là vị trí file gốc. File "near" vẫn phải OCR, chỉ
+# là ứng viên trùng (giấy chứng nhận cùng mẫu khác số thửa cũng gần giống).
+# `hashes`: hash nội dung từng file (upload_hash) nếu đã tính sẵn.
+def find_duplicate_files(uploaded_files, records=None, hashes=None):
+    if not dedup.DEDUP:
+        return [None] * len(uploaded_files)
+    records = records or [metrics.current()] * len(uploaded_files)
+    hashes = hashes or [None] * len(uploaded_files)
+    digests, page_hashes = [], []
+    for uploaded_file, record, digest in zip(uploaded_files, records, hashes):
+        source = pdf_source(uploaded_file)
+        with metrics.active(record), metrics.stage("dedup"):
+            digest = digest or content_hash(source)
+            if digest in digests:
+                pages = []  # file giống hệt, không cần hash từng trang
+            else:
+                with open_pdf(source) as doc:
+                    pages = dedup.document_hashes(doc)
+        digests.append(digest)
+        page_hashes.append(pages)
+    return dedup.find_duplicates(digests, page_hashes)
+
+
+# Thông tin thửa đất và người sử dụng đất cho template DOCX (app_2, app_3, app_single).
+# `text` là text đã qua clean_text như ở mọi nơi gọi (kể cả text lưu trong kho), nên
+# không chuẩn hoá lại.
+def extract_land_info(text):
+    with metrics.stage("extract"):
+        return field_extraction.extract_land_info(text)
+
+
+# Một dòng của sheet ThongTinDat
+def extract_land_info_for_excel(text):
+    with metrics.stage("extract"):
+        return field_extraction.extract_land_info_for_excel(text)
+
+
+# Thứ tự cột của sheet ThongTinDat
+EXCEL_COLUMNS = ["Chủ sở hữu", "Thửa", "Tờ", "Diện tích", "Xã", "Số phát hành", "Tên file"]
+# Cột đánh dấu file trùng với một file khác trong cùng lô upload (app.py)
+DUPLICATE_COLUMN = "Trùng với"
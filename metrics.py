@@ -0,0 +1,286 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Đo thời gian và bộ nhớ từng bước xử lý của mỗi file (render, OCR, trích xuất,
+# xuất file...). Mỗi file là một "document": các bước chạy bên trong
+# `with document(tên file):` (hoặc `with active(record):`) được cộng dồn vào
+# document đó qua contextvars, kể cả khi nhiều phiên Streamlit chạy song song.
+#
+# Khi một document kết thúc (publish), kết quả được ghi thành một dòng JSON
+# (OCR_METRICS_LOG: đường dẫn file, để trống thì ghi ra stderr) và cộng vào các
+# bộ đếm kiểu Prometheus (render_prometheus, hoặc file OCR_METRICS_PROM cho
+# textfile collector của node_exporter).
+#
+# Tiến trình con (pool OCR, batch_cli, job_queue) đo bằng `capture()` rồi gửi
+# kết quả về tiến trình cha để merge/publish, vì bộ đếm nằm trong từng tiến trình.
+OCR_METRICS = os.environ.get("OCR_METRICS", "1") != "0"
+OCR_METRICS_LOG = os.environ.get("OCR_METRICS_LOG", "")
+OCR_METRICS_PROM = os.environ.get("OCR_METRICS_PROM", "")
+# tracemalloc làm chậm cấp phát bộ nhớ của Python nên chỉ bật khi cần đo đỉnh bộ nhớ.
+# Đỉnh bộ nhớ của mỗi document là đỉnh lớn nhất trong các bước (stage) của chính nó;
+# tracemalloc tính chung cả tiến trình nên khi nhiều phiên chạy song song trong các
+# luồng, đỉnh của một document có thể gồm cả bộ nhớ của luồng khác. process_max_rss_mb
+# là mức RSS cao nhất của cả tiến trình từ lúc khởi động, không phải của riêng file.
+OCR_METRICS_TRACEMALLOC = os.environ.get("OCR_METRICS_TRACEMALLOC", "0") == "1"
+
+DOCUMENT_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60, 120, 300]
+
+_current = contextvars.ContextVar("ocr_metrics_document", default=None)
+_lock = threading.Lock()
+_logger = None
+_counters = {
+    "documents": 0,
+    "pages": 0,
+    "document_seconds_sum": 0.0,
+    "document_buckets": [0] * len(DOCUMENT_BUCKETS),
+    "stages": {},
+    "skipped": {},
+}
+
+
+def _cpu_time():
+    # CPU của tiến trình và các tiến trình con đã kết thúc (lệnh tesseract của pytesseract)
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss tính bằng KB trên Linux, bytes trên macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def new_document(name=None):
+    if OCR_METRICS_TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return {"file": name, "pages": 0, "stages": {}, "skipped": {}, "_peak": 0,
+            "_t0": time.perf_counter(), "_c0": _cpu_time()}
+
+
+def current():
+    return _current.get()
+
+
+# Gắn các bước đo sau đó (trong cùng luồng/context) vào record
+@contextmanager
+def active(record):
+    token = _current.set(record)
+    try:
+        yield record
+    finally:
+        _current.reset(token)
+
+
+def add_stage(record, name, wall, cpu, pages=0, calls=1):
+    if record is None:
+        return
+    stats = record["stages"].setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0, "pages": 0})
+    stats["wall_seconds"] += wall
+    stats["cpu_seconds"] += cpu
+    stats["calls"] += calls
+    stats["pages"] += pages
+
+
+# Cộng đỉnh bộ nhớ tracemalloc kể từ lần đặt lại trước vào record rồi đặt lại đỉnh
+def _take_peak(record):
+    if OCR_METRICS_TRACEMALLOC and tracemalloc.is_tracing():
+        record["_peak"] = max(record["_peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+
+# Đo một bước: with stage("ocr", pages=1): ...
+@contextmanager
+def stage(name, pages=0):
+    record = _current.get()
+    if not OCR_METRICS or record is None:
+        yield
+        return
+    _take_peak(record)
+    started, cpu_started = time.perf_counter(), _cpu_time()
+    try:
+        yield
+    finally:
+        add_stage(record, name, time.perf_counter() - started, _cpu_time() - cpu_started, pages)
+        _take_peak(record)
+
+
+# Đếm trang được bỏ qua không OCR (xem page_triage.py) theo lý do
+def skip_page(reason, count=1, record=None):
+    record = record if record is not None else _current.get()
+    if record is not None:
+        record["skipped"][reason] = record["skipped"].get(reason, 0) + count
+
+
+def set_pages(pages, record=None):
+    record = record if record is not None else _current.get()
+    if record is not None:
+        record["pages"] = pages
+
+
+# Kết thúc đo một document, trả về bản tóm tắt (dict, dùng được với JSON/pickle)
+def finish_document(record):
+    summary = {
+        "file": record["file"],
+        "pages": record["pages"],
+        "wall_seconds": round(time.perf_counter() - record["_t0"], 4),
+        "cpu_seconds": round(_cpu_time() - record["_c0"], 4),
+        "process_max_rss_mb": _max_rss_mb(),
+        "skipped_pages": dict(record["skipped"]),
+        "stages": {
+            name: {**stats, "wall_seconds": round(stats["wall_seconds"], 4), "cpu_seconds": round(stats["cpu_seconds"], 4)}
+            for name, stats in record["stages"].items()
+        },
+    }
+    if OCR_METRICS_TRACEMALLOC:
+        summary["peak_traced_mb"] = round(record["_peak"] / (1024 * 1024), 1)
+    return summary
+
+
+# Cộng kết quả đo ở tiến trình con (bản tóm tắt) vào record của tiến trình cha
+def merge(record, summary):
+    if record is None or summary is None:
+        return
+    # Trang được đếm ở nơi mở file: tiến trình con khi OCR cả file (roi, adaptive)
+    record["pages"] = max(record["pages"], summary.get("pages", 0))
+    if "peak_traced_mb" in summary:
+        record["_peak"] = max(record["_peak"], int(summary["peak_traced_mb"] * 1024 * 1024))
+    for name, stats in summary["stages"].items():
+        add_stage(record, name, stats["wall_seconds"], stats["cpu_seconds"], stats["pages"], stats["calls"])
+    for reason, count in summary.get("skipped_pages", {}).items():
+        skip_page(reason, count, record)
+
+
+# Dùng trong tiến trình con: đo các bước bên trong, lấy bản tóm tắt qua record["summary"]
+@contextmanager
+def capture(name=None):
+    record = new_document(name)
+    with active(record):
+        try:
+            yield record
+        finally:
+            record["summary"] = finish_document(record)
+
+
+def _get_logger():
+    global _logger
+    # Khoá để các luồng ghi log đầu tiên cùng lúc (api_server.py) không gắn hai handler
+    with _lock:
+        if _logger is None:
+            logger = logging.getLogger("ocr_metrics")
+            logger.propagate = False
+            if not logger.handlers:
+                handler = (logging.FileHandler(OCR_METRICS_LOG, encoding="utf-8") if OCR_METRICS_LOG
+                           else logging.StreamHandler())
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            _logger = logger
+    return _logger
+
+
+# Ghi log JSON và cộng vào bộ đếm Prometheus
+def publish(summary):
+    if not OCR_METRICS or summary is None:
+        return
+    with _lock:
+        _counters["documents"] += 1
+        _counters["pages"] += summary["pages"]
+        _counters["document_seconds_sum"] += summary["wall_seconds"]
+        for i, bound in enumerate(DOCUMENT_BUCKETS):
+            if summary["wall_seconds"] <= bound:
+                _counters["document_buckets"][i] += 1
+        for name, stats in summary["stages"].items():
+            totals = _counters["stages"].setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0, "pages": 0})
+            for key in totals:
+                totals[key] += stats[key]
+        for reason, count in summary.get("skipped_pages", {}).items():
+            _counters["skipped"][reason] = _counters["skipped"].get(reason, 0) + count
+    _get_logger().info(json.dumps({"event": "document", "time": round(time.time(), 3), **summary}, ensure_ascii=False))
+    if OCR_METRICS_PROM:
+        write_prometheus(OCR_METRICS_PROM)
+
+
+# Đo cả một file: with document(tên file) as record: ...; kết quả nằm ở record["summary"]
+@contextmanager
+def document(name):
+    record = None
+    try:
+        with capture(name) as record:
+            yield record
+    finally:
+        if record is not None:
+            publish(record["summary"])
+
+
+def render_prometheus():
+    with _lock:
+        lines = [
+            "# HELP ocr_documents_total Số file đã xử lý",
+            "# TYPE ocr_documents_total counter",
+            f"ocr_documents_total {_counters['documents']}",
+            "# HELP ocr_pages_total Số trang đã xử lý",
+            "# TYPE ocr_pages_total counter",
+            f"ocr_pages_total {_counters['pages']}",
+            "# HELP ocr_document_seconds Thời gian xử lý mỗi file",
+            "# TYPE ocr_document_seconds histogram",
+        ]
+        # Mỗi bucket đã được đếm cộng dồn (mọi file có thời gian <= le) trong publish
+        for bound, count in zip(DOCUMENT_BUCKETS, _counters["document_buckets"]):
+            lines.append(f'ocr_document_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f'ocr_document_seconds_bucket{{le="+Inf"}} {_counters["documents"]}')
+        lines.append(f"ocr_document_seconds_sum {_counters['document_seconds_sum']:.4f}")
+        lines.append(f"ocr_document_seconds_count {_counters['documents']}")
+        lines.append("# HELP ocr_pages_skipped_total Số trang bỏ qua không OCR theo lý do")
+        lines.append("# TYPE ocr_pages_skipped_total counter")
+        for reason, count in sorted(_counters["skipped"].items()):
+            lines.append(f'ocr_pages_skipped_total{{reason="{reason}"}} {count}')
+        for metric, key, kind, help_text in [
+            ("ocr_stage_seconds_total", "wall_seconds", "counter", "Thời gian thực của từng bước"),
+            ("ocr_stage_cpu_seconds_total", "cpu_seconds", "counter", "Thời gian CPU của từng bước"),
+            ("ocr_stage_calls_total", "calls", "counter", "Số lần chạy từng bước"),
+            ("ocr_stage_pages_total", "pages", "counter", "Số trang đi qua từng bước"),
+        ]:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in sorted(_counters["stages"].items()):
+                lines.append(f'{metric}{{stage="{name}"}} {round(stats[key], 4)}')
+    max_rss = _max_rss_mb()
+    if max_rss is not None:
+        lines += [
+            "# HELP ocr_process_max_rss_bytes Bộ nhớ RSS đỉnh của tiến trình",
+            "# TYPE ocr_process_max_rss_bytes gauge",
+            f"ocr_process_max_rss_bytes {int(max_rss * 1024 * 1024)}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+# Ghi file cho textfile collector (ghi file tạm rồi đổi tên để không bị đọc dở).
+# Mỗi lần ghi một file tạm riêng vì publish chạy đồng thời từ nhiều luồng.
+def write_prometheus(path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(render_prometheus())
+        os.chmod(tmp_path, 0o644)  # mkstemp tạo file 0600, node_exporter có thể chạy bằng user khác
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
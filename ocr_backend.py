@@ -0,0 +1,136 @@
+import os
+import threading
+import warnings
+
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr là tuỳ chọn, cần libtesseract khi cài
+    tesserocr = None
+
+# Backend OCR dùng chung cho tất cả các app.
+#   - "tesserocr": gọi thẳng libtesseract trong tiến trình. Mỗi luồng của mỗi
+#     tiến trình giữ một engine đã nạp sẵn dữ liệu ngôn ngữ, ảnh truyền trong bộ nhớ.
+#   - "pytesseract": mỗi lần gọi ghi ảnh ra file tạm và chạy lệnh tesseract,
+#     nạp lại traineddata mỗi trang. Chậm hơn nhưng chỉ cần cài tesseract-ocr.
+#   - "auto" (mặc định): tesserocr nếu đã cài, ngược lại pytesseract.
+# Chọn backend bằng biến môi trường OCR_BACKEND để so sánh hai cách.
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto")
+OCR_LANG = "vie"
+TESSERACT_CMD = "/usr/bin/tesseract"
+TESSDATA_PREFIX = os.environ.get("TESSDATA_PREFIX", "")
+
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+# Các khoá kết quả image_to_data giống pytesseract.Output.DICT
+DATA_KEYS = ["level", "page_num", "block_num", "par_num", "line_num", "word_num",
+             "left", "top", "width", "height", "conf", "text"]
+
+_local = threading.local()
+_fallback_reason = None
+
+
+# Tên backend thực sự được dùng
+def active_backend(backend=None):
+    backend = backend or OCR_BACKEND
+    if backend == "auto":
+        backend = "tesserocr" if tesserocr is not None else "pytesseract"
+    if backend == "tesserocr" and (tesserocr is None or _fallback_reason is not None):
+        return "pytesseract"
+    return backend
+
+
+# Phiên bản Tesseract của backend đang dùng (đưa vào khoá cache OCR)
+def backend_version(backend=None):
+    if _use_tesserocr(backend, OCR_LANG):
+        return f"tesserocr:{tesserocr.tesseract_version().splitlines()[0]}"
+    return f"pytesseract:{pytesseract.get_tesseract_version()}"
+
+
+def _fall_back(error):
+    global _fallback_reason
+    _fallback_reason = f"{type(error).__name__}: {error}"
+    warnings.warn(f"Không khởi tạo được tesserocr ({_fallback_reason}), dùng pytesseract")
+
+
+# Engine tesserocr của luồng hiện tại cho ngôn ngữ `lang`, chỉ khởi tạo một lần
+def get_engine(lang=OCR_LANG):
+    engines = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    if lang not in engines:
+        kwargs = {"lang": lang}
+        if TESSDATA_PREFIX:
+            kwargs["path"] = TESSDATA_PREFIX
+        engines[lang] = tesserocr.PyTessBaseAPI(**kwargs)
+    return engines[lang]
+
+
+def _prepare_engine(img, lang, psm):
+    engine = get_engine(lang)
+    engine.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+    engine.SetImage(img)
+    return engine
+
+
+def _tesserocr_data(engine):
+    engine.Recognize()
+    data = {key: [] for key in DATA_KEYS}
+    iterator = engine.GetIterator()
+    if iterator is None:
+        return data
+    level = tesserocr.RIL.WORD
+    block = par = line = word = 0
+    for result in tesserocr.iterate_level(iterator, level):
+        if result.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+            block, par, line = block + 1, 0, 0
+        if result.IsAtBeginningOf(tesserocr.RIL.PARA):
+            par, line = par + 1, 0
+        if result.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+            line, word = line + 1, 0
+        box = result.BoundingBox(level)
+        if box is None:
+            continue
+        word += 1
+        left, top, right, bottom = box
+        row = {
+            "level": 5, "page_num": 1, "block_num": block, "par_num": par, "line_num": line, "word_num": word,
+            "left": left, "top": top, "width": right - left, "height": bottom - top,
+            "conf": result.Confidence(level), "text": result.GetUTF8Text(level) or "",
+        }
+        for key in DATA_KEYS:
+            data[key].append(row[key])
+    return data
+
+
+def _use_tesserocr(backend, lang):
+    if active_backend(backend) != "tesserocr":
+        return False
+    try:
+        get_engine(lang)
+    except RuntimeError as e:  # thiếu traineddata, sai TESSDATA_PREFIX...
+        _fall_back(e)
+        return False
+    return True
+
+
+# Khởi tạo sẵn engine khi tiến trình OCR bắt đầu (initializer của pool tiến trình)
+def warm_up(lang=OCR_LANG):
+    _use_tesserocr(None, lang)
+
+
+# OCR ảnh PIL thành text; psm=None dùng chế độ phân trang mặc định của Tesseract
+def image_to_string(img, lang=OCR_LANG, psm=None, backend=None):
+    if _use_tesserocr(backend, lang):
+        return _prepare_engine(img, lang, psm).GetUTF8Text()
+    config = f"--psm {psm}" if psm is not None else ""
+    return pytesseract.image_to_string(img, lang=lang, config=config)
+
+
+# Vị trí, độ tin cậy và text từng từ, cùng định dạng pytesseract.Output.DICT
+def image_to_data(img, lang=OCR_LANG, psm=None, backend=None):
+    if _use_tesserocr(backend, lang):
+        return _tesserocr_data(_prepare_engine(img, lang, psm))
+    config = f"--psm {psm}" if psm is not None else ""
+    return pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
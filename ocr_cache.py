@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+
+from ocr_backend import backend_version
+from page_triage import triage_signature
+from preprocess import preprocess_signature
+
+# Cache kết quả OCR trên đĩa, dùng chung cho tất cả các app. Khoá gồm hash nội
+# dung PDF, DPI, ngôn ngữ, cấu hình chọn trang dùng lớp text, tiền xử lý ảnh và
+# phân loại trang nên Streamlit chạy lại script hoặc upload lại cùng file sẽ không
+# phải OCR lại.
+# Backend OCR và phiên bản Tesseract được lưu trong mục cache (chỉ khi có trang
+# phải OCR hoặc phân loại) và so khi đọc, nên file chỉ có lớp text không cần gọi
+# Tesseract để lấy phiên bản.
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", ".ocr_cache")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_MB", 512)) * 1024 * 1024
+
+# Chỉ quét thư mục để dọn cache sau mỗi N lần ghi (tránh quét lại toàn bộ
+# thư mục sau từng file khi chạy hàng loạt)
+EVICT_EVERY = 32
+
+_tesseract_version = None
+_writes_since_evict = 0
+
+
+def tesseract_version():
+    global _tesseract_version
+    if _tesseract_version is None:
+        _tesseract_version = backend_version()
+    return _tesseract_version
+
+
+# Hash SHA-256 nội dung PDF (bytes hoặc đường dẫn file, đọc theo từng khối)
+def content_hash(source):
+    h = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    else:
+        h.update(source)
+    return h.hexdigest()
+
+
+# `text_layer`: cấu hình chọn trang dùng lớp text (ocr_engine.text_layer_signature)
+def cache_key(source, dpi, lang, text_layer):
+    params = (f"{content_hash(source)}|{dpi}|{lang}|{text_layer}"
+              f"|{preprocess_signature()}|{triage_signature()}")
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key, cache_dir=None):
+    return os.path.join(cache_dir or OCR_CACHE_DIR, key[:2], key + ".json")
+
+
+# Phiên bản engine OCR đã tạo ra các trang; None nếu mọi trang đọc từ lớp text
+def engine_version(pages):
+    return tesseract_version() if any(page["source"] != "text" for page in pages) else None
+
+
+# Đọc danh sách trang đã OCR; cập nhật mtime để đánh dấu vừa được dùng (LRU).
+# Mục do phiên bản engine OCR khác tạo ra thì coi như không có.
+def load_pages(key, cache_dir=None):
+    path = _cache_path(key, cache_dir)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry["engine"] is not None and entry["engine"] != tesseract_version():
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    pages = entry["pages"]
+    for page in pages:
+        page["words"] = [tuple(word) for word in page["words"]]
+    return pages
+
+
+def save_pages(key, pages, cache_dir=None, max_bytes=None):
+    global _writes_since_evict
+    path = _cache_path(key, cache_dir)
+    entry = {"engine": engine_version(pages), "pages": pages}
+    # Ghi ra file tạm riêng của lần ghi này rồi đổi tên, để các phiên chạy song song
+    # (kể cả nhiều luồng cùng ghi một khoá) không đọc phải file dở hay xoá file tạm
+    # của nhau. Ghi cache lỗi chỉ cảnh báo, không làm hỏng lần OCR.
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        warnings.warn(f"Không ghi được cache OCR {path}: {e}")
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return
+    _writes_since_evict += 1
+    if _writes_since_evict >= EVICT_EVERY:
+        _writes_since_evict = 0
+        evict(cache_dir, max_bytes)
+
+
+# Xoá các mục ít được dùng gần đây nhất cho đến khi tổng dung lượng dưới giới hạn
+def evict(cache_dir=None, max_bytes=None):
+    cache_dir = cache_dir or OCR_CACHE_DIR
+    max_bytes = max_bytes or OCR_CACHE_MAX_BYTES
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= max_bytes:
+            break
@@ -0,0 +1,362 @@
+import os
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+from pdf2image import convert_from_bytes, convert_from_path
+
+import dedup
+import metrics
+import ocr_cache
+import page_triage
+from ocr_backend import OCR_LANG, image_to_string, warm_up
+from preprocess import preprocess_image
+
+# Chỉ định đường dẫn Poppler (dùng chung cho tất cả các app); đường dẫn Tesseract
+# và backend OCR nằm trong ocr_backend.py
+POPPLER_PATH = "/usr/bin"  # Thay nếu dùng Windows
+OCR_DPI = 200  # DPI mặc định của pdf2image
+
+# Ngưỡng để coi lớp text của trang PDF là dùng được
+MIN_TEXT_CHARS = 30         # trang có ít ký tự hơn thì coi như trang ảnh
+MIN_LETTER_RATIO = 0.5      # tỉ lệ chữ cái / ký tự không phải khoảng trắng
+MAX_BAD_CHAR_RATIO = 0.05   # tỉ lệ ký tự lỗi (U+FFFD) khi font thiếu bảng ToUnicode
+MAX_IMAGE_COVERAGE = 0.5    # ảnh phủ hơn tỉ lệ diện tích trang này thì có thể là trang scan...
+MIN_TEXT_COVERAGE = 0.05    # ...trừ khi chữ của lớp text phủ ít nhất tỉ lệ này (PDF scan đã có lớp OCR)
+
+# Số tiến trình OCR song song (mặc định bằng số lõi CPU)
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", os.cpu_count() or 1))
+
+# Số trang được render thành ảnh cùng lúc; bộ nhớ đỉnh tỉ lệ với giá trị này
+# chứ không phụ thuộc số trang của file
+OCR_WINDOW = int(os.environ.get("OCR_WINDOW", 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Lấy nội dung bytes của file upload (Streamlit UploadedFile, file object hoặc bytes)
+def read_pdf_bytes(pdf_bytes):
+    if isinstance(pdf_bytes, (bytes, bytearray)):
+        return bytes(pdf_bytes)
+    if hasattr(pdf_bytes, "getvalue"):
+        return pdf_bytes.getvalue()
+    return pdf_bytes.read()
+
+
+# Nguồn PDF: đường dẫn file (đọc trực tiếp từ đĩa, không nạp cả file vào bộ nhớ)
+# hoặc bytes của file upload
+def pdf_source(pdf):
+    if isinstance(pdf, (str, os.PathLike)):
+        return os.fspath(pdf)
+    return read_pdf_bytes(pdf)
+
+
+def open_pdf(source):
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+# Render các trang first..last (đánh số từ 0) thành ảnh PIL
+def render_pages(source, first, last, dpi=OCR_DPI):
+    kwargs = dict(dpi=dpi, first_page=first + 1, last_page=last + 1, poppler_path=POPPLER_PATH)
+    with metrics.stage("render", pages=last - first + 1):
+        if isinstance(source, str):
+            return convert_from_path(source, **kwargs)
+        return convert_from_bytes(source, **kwargs)
+
+
+# Kiểm tra lớp text của trang có đủ tin cậy để bỏ qua OCR hay không
+def is_text_layer_usable(text):
+    content = "".join(text.split())
+    if len(content) < MIN_TEXT_CHARS:
+        return False
+    if content.count("�") / len(content) > MAX_BAD_CHAR_RATIO:
+        return False
+    letters = sum(1 for ch in content if ch.isalpha())
+    return letters / len(content) >= MIN_LETTER_RATIO
+
+
+# Cấu hình chọn trang dùng lớp text, là một phần khoá cache OCR (ocr_cache.py)
+def text_layer_signature(use_text_layer=True):
+    if not use_text_layer:
+        return "off"
+    return f"{MIN_TEXT_CHARS}:{MIN_LETTER_RATIO}:{MAX_BAD_CHAR_RATIO}:{MAX_IMAGE_COVERAGE}:{MIN_TEXT_COVERAGE}"
+
+
+# Trang scan chỉ có một ít chữ trong lớp text (chữ ký số "Được ký bởi: ...", dấu
+# "Bản sao"...): ảnh phủ gần hết trang nhưng chữ của lớp text chỉ chiếm phần nhỏ,
+# nội dung chính nằm trong ảnh nên vẫn phải OCR
+def is_scanned_page(page, words):
+    page_area = page.rect.width * page.rect.height
+    if not page_area:
+        return False
+    image_area = 0.0
+    for info in page.get_image_info():
+        box = fitz.Rect(info["bbox"]) & page.rect
+        if not box.is_empty:
+            image_area += box.width * box.height
+    if image_area / page_area <= MAX_IMAGE_COVERAGE:
+        return False
+    text_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1, _ in words)
+    return text_area / page_area < MIN_TEXT_COVERAGE
+
+
+# Đọc text và vị trí từng từ trực tiếp từ lớp text của trang PDF
+def read_text_layer(page):
+    text = page.get_text("text")
+    words = [(x0, y0, x1, y1, word) for x0, y0, x1, y1, word, *_ in page.get_text("words")]
+    return text, words
+
+
+# OCR một ảnh trang (render ở `dpi`) sau khi tiền xử lý (xem preprocess.py)
+def ocr_image(img, lang=OCR_LANG, dpi=OCR_DPI):
+    with metrics.stage("preprocess", pages=1):
+        prepared = preprocess_image(img, dpi)
+    with metrics.stage("ocr", pages=1):
+        text = image_to_string(prepared, lang)
+    if prepared is not img:
+        prepared.close()
+    return text
+
+
+# OCR một trang PDF (đánh số từ 0) sau khi chuyển thành ảnh
+def ocr_pdf_page(source, page_index, dpi=OCR_DPI, lang=OCR_LANG):
+    text = ""
+    for img in render_pages(source, page_index, page_index, dpi):
+        text += ocr_image(img, lang, dpi)
+        img.close()
+    return text
+
+
+# Phân loại trang ảnh trước khi OCR (xem page_triage.py); trả về "text" hoặc lý do bỏ qua
+def triage_page(page, lang=OCR_LANG):
+    with metrics.stage("triage", pages=1):
+        verdict = page_triage.classify_page(page, lang)
+    if verdict != "text":
+        metrics.skip_page(verdict)
+    return verdict
+
+
+# OCR một trang ảnh nếu trang có thể chứa chữ; trả về text và kết quả phân loại
+def read_scanned_page(source, page_index, dpi=OCR_DPI, lang=OCR_LANG):
+    verdict = "text"
+    if page_triage.TRIAGE:
+        with open_pdf(source) as doc:
+            verdict = triage_page(doc[page_index], lang)
+    if verdict != "text":
+        return "", verdict
+    return ocr_pdf_page(source, page_index, dpi, lang), verdict
+
+
+# Đánh dấu trang bỏ qua không OCR (text rỗng)
+def mark_skipped(page, verdict):
+    page.update(text="", source="skipped", triage=verdict)
+
+
+# Phân loại các trang cần OCR của một file, đánh dấu các trang bỏ qua
+def triage_pages(source, pages, lang=OCR_LANG):
+    if not page_triage.TRIAGE or all(page["text"] is not None for page in pages):
+        return
+    with open_pdf(source) as doc:
+        for page in pages:
+            if page["text"] is None:
+                verdict = triage_page(doc[page["page"]], lang)
+                if verdict != "text":
+                    mark_skipped(page, verdict)
+
+
+# Chạy trong tiến trình của pool: OCR một trang, trả về text, kết quả phân loại
+# và thời gian từng bước để tiến trình cha cộng vào document tương ứng (xem metrics.py)
+def ocr_page_task(source, page_index, dpi=OCR_DPI, lang=OCR_LANG):
+    with metrics.capture() as record:
+        text, verdict = read_scanned_page(source, page_index, dpi, lang)
+    return text, verdict, record["summary"]
+
+
+# Pool tiến trình OCR dùng chung trong cả tiến trình (Streamlit chạy lại script
+# nhưng module này chỉ được import một lần nên pool không bị tạo lại). Số tiến
+# trình được chọn khi tạo pool; lời gọi sau với `workers` khác vẫn dùng pool đó vì
+# tạo lại sẽ huỷ việc đang chạy của người dùng khác. Một tiến trình con chết
+# (hết bộ nhớ, Tesseract lỗi) làm hỏng cả pool (BrokenProcessPool), khi đó pool
+# được tạo lại ở lần gọi sau thay vì mọi lần OCR sau đều lỗi.
+def get_ocr_pool(workers=None):
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool._broken:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # "spawn" để tránh fork khi tiến trình cha đang chạy nhiều luồng (Streamlit)
+            # Mỗi tiến trình nạp engine OCR một lần khi khởi động (xem ocr_backend.py)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers or OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up,
+            )
+        return _pool
+
+
+# Đọc lớp text của từng trang; các trang cần OCR được đánh dấu text = None
+def plan_pages(source, use_text_layer=True):
+    pages = []
+    with metrics.stage("text_layer"), open_pdf(source) as doc:
+        for page in doc:
+            if use_text_layer:
+                text, words = read_text_layer(page)
+                if is_text_layer_usable(text) and not is_scanned_page(page, words):
+                    pages.append({"page": page.number, "text": text, "words": words, "source": "text"})
+                    continue
+            pages.append({"page": page.number, "text": None, "words": [], "source": "ocr"})
+    return pages
+
+
+# Tìm các trang cần OCR giống hệt một trang khác trong lô (xem dedup.py); trả về
+# {(file, trang): (file, trang) gốc}
+def find_repeated_pages(sources, pending, records):
+    digests = {}
+    for doc_index in sorted({doc_index for doc_index, _ in pending}):
+        with metrics.active(records[doc_index]), metrics.stage("dedup"), open_pdf(sources[doc_index]) as doc:
+            for item in pending:
+                if item[0] == doc_index:
+                    digests[item] = dedup.page_digest(doc[item[1]])
+    return dedup.repeated_pages(digests)
+
+
+# Ghi các file dạng bytes có trang cần OCR ra file tạm, mỗi file một lần: tác vụ OCR
+# từng trang chỉ nhận đường dẫn và số trang thay vì cả nội dung file; xoá khi xong
+@contextmanager
+def spooled_sources(sources, doc_indexes):
+    paths = list(sources)
+    temp_paths = []
+    try:
+        for doc_index in sorted(doc_indexes):
+            if not isinstance(sources[doc_index], str):
+                with tempfile.NamedTemporaryFile("wb", suffix=".pdf", delete=False) as f:
+                    temp_paths.append(f.name)
+                    f.write(sources[doc_index])
+                paths[doc_index] = f.name
+        yield paths
+    finally:
+        for path in temp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Trích xuất text của nhiều file PDF cùng lúc. Các trang cần OCR của tất cả các
+# file được chia đều cho pool tiến trình (workers <= 1 thì OCR lần lượt trong
+# tiến trình hiện tại), sau đó ghép lại đúng thứ tự trang.
+# Mỗi phần tử của kết quả là danh sách trang của một file (xem extract_pages).
+# `records`: record đo thời gian (metrics.py) của từng file; mặc định dùng record
+# hiện tại cho tất cả.
+def extract_documents(pdf_list, use_text_layer=True, dpi=OCR_DPI, lang=OCR_LANG, workers=None, use_cache=True,
+                      records=None):
+    workers = workers or OCR_WORKERS
+    sources = [pdf_source(pdf) for pdf in pdf_list]
+    records = records or [metrics.current()] * len(sources)
+    keys, documents = [], []
+    for source, record in zip(sources, records):
+        with metrics.active(record), metrics.stage("cache"):
+            key = ocr_cache.cache_key(source, dpi, lang, text_layer_signature(use_text_layer)) if use_cache else None
+            documents.append(ocr_cache.load_pages(key) if key else None)
+        keys.append(key)
+    misses = [doc_index for doc_index, pages in enumerate(documents) if pages is None]
+    for doc_index in misses:
+        with metrics.active(records[doc_index]):
+            documents[doc_index] = plan_pages(sources[doc_index], use_text_layer)
+    for doc_index, pages in enumerate(documents):
+        metrics.set_pages(len(pages), records[doc_index])
+    pending = [
+        (doc_index, page["page"])
+        for doc_index, pages in enumerate(documents)
+        for page in pages if page["text"] is None
+    ]
+    # Trang giống hệt một trang khác trong lô chỉ OCR một lần
+    aliases = find_repeated_pages(sources, pending, records) if dedup.DEDUP and len(pending) > 1 else {}
+    pending = [item for item in pending if item not in aliases]
+
+    with spooled_sources(sources, {doc_index for doc_index, _ in pending}) as paths:
+        if workers <= 1 or len(pending) <= 1:
+            for doc_index, page_index in pending:
+                with metrics.active(records[doc_index]):
+                    text, verdict = read_scanned_page(paths[doc_index], page_index, dpi, lang)
+                if verdict == "text":
+                    documents[doc_index][page_index]["text"] = text
+                else:
+                    mark_skipped(documents[doc_index][page_index], verdict)
+        else:
+            # Mỗi tiến trình chỉ render một trang tại một thời điểm
+            pool = get_ocr_pool(workers)
+            futures = {
+                pool.submit(ocr_page_task, paths[doc_index], page_index, dpi, lang): (doc_index, page_index)
+                for doc_index, page_index in pending
+            }
+            for future in as_completed(futures):
+                doc_index, page_index = futures[future]
+                text, verdict, summary = future.result()
+                if verdict == "text":
+                    documents[doc_index][page_index]["text"] = text
+                else:
+                    mark_skipped(documents[doc_index][page_index], verdict)
+                metrics.merge(records[doc_index], summary)
+    for (doc_index, page_index), (original_doc, original_page) in aliases.items():
+        original = documents[original_doc][original_page]
+        documents[doc_index][page_index].update(
+            {key: original[key] for key in ("text", "source", "triage") if key in original})
+
+    for doc_index in misses:
+        if keys[doc_index]:
+            with metrics.active(records[doc_index]), metrics.stage("cache"):
+                ocr_cache.save_pages(keys[doc_index], documents[doc_index])
+    return documents
+
+
+# Sinh lần lượt từng trang đã có text: mỗi lần chỉ render tối đa `window` trang ảnh
+# liên tiếp, OCR xong thì giải phóng ảnh ngay trước khi render tiếp.
+def iter_pages(pdf, use_text_layer=True, dpi=OCR_DPI, lang=OCR_LANG, window=OCR_WINDOW, use_cache=True):
+    source = pdf_source(pdf)
+    with metrics.stage("cache"):
+        key = ocr_cache.cache_key(source, dpi, lang, text_layer_signature(use_text_layer)) if use_cache else None
+        cached = ocr_cache.load_pages(key) if key else None
+    if cached is not None:
+        metrics.set_pages(len(cached))
+        yield from cached
+        return
+
+    pages = plan_pages(source, use_text_layer)
+    metrics.set_pages(len(pages))
+    triage_pages(source, pages, lang)
+    rendered = {}
+    for page in pages:
+        index = page["page"]
+        if page["text"] is None:
+            if index not in rendered:
+                last = index
+                while last + 1 < len(pages) and last + 1 - index < window and pages[last + 1]["text"] is None:
+                    last += 1
+                rendered = dict(zip(range(index, last + 1), render_pages(source, index, last, dpi)))
+            img = rendered.pop(index)
+            page["text"] = ocr_image(img, lang, dpi)
+            img.close()
+        yield page
+    if key:
+        with metrics.stage("cache"):
+            ocr_cache.save_pages(key, pages)
+
+
+# Trích xuất text từng trang: dùng lớp text của PDF nếu có, chỉ OCR các trang ảnh.
+# Mỗi phần tử trả về gồm: page (số thứ tự), text, words (toạ độ từng từ nếu đọc
+# từ lớp text) và source ("text", "ocr" hoặc "skipped" cho trang trắng, sơ đồ,
+# phụ lục bỏ qua không OCR, kèm triage là lý do bỏ qua; xem page_triage.py).
+def extract_pages(pdf_bytes, use_text_layer=True, dpi=OCR_DPI, lang=OCR_LANG, workers=None, use_cache=True):
+    return extract_documents([pdf_bytes], use_text_layer, dpi, lang, workers, use_cache)[0]
+
+
+# Ghép text các trang theo đúng thứ tự như cách OCR cũ (mỗi trang kết thúc bằng \n)
+def join_pages(pages):
+    return "".join(page["text"] + "\n" for page in pages)
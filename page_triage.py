@@ -0,0 +1,100 @@
+import os
+import unicodedata
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from ocr_backend import OCR_LANG, image_to_string
+
+# Phân loại nhanh các trang ảnh trước khi OCR đầy đủ để bỏ qua trang trắng (mặt
+# sau để trống), sơ đồ thửa đất và trang phụ lục không chứa trường cần trích xuất.
+#
+# Tín hiệu trên ảnh thu nhỏ TRIAGE_DPI (rẻ hơn OCR hàng trăm lần):
+#   - mật độ mực: dưới TRIAGE_BLANK_INK là trang trắng;
+#   - số dòng chữ: số dải hàng điểm ảnh liên tiếp có mật độ mực như dòng chữ, ngăn
+#     cách bởi khoảng trắng hoặc đường kẻ bảng, cao cỡ một dòng chữ (TEXT_LINE_HEIGHT);
+#   - tỉ lệ hình vẽ: phần mực không nằm trong các dòng chữ đó. Nét vẽ của sơ đồ trải
+#     liền hàng trăm hàng điểm ảnh nên gần như toàn bộ mực là hình vẽ, còn trang văn
+#     bản, kể cả dạng bảng như sổ địa chính, có tỉ lệ này thấp.
+# Trang không giống trang chữ được OCR thử ở TRIAGE_PROBE_DPI để tìm từ khoá của
+# giấy chứng nhận; không thấy từ khoá nào mới bỏ qua, nên trang lạ vẫn được OCR.
+#
+# OCR_TRIAGE_PROBE: "auto" chỉ OCR thử trang không giống trang chữ; "all" OCR thử
+# mọi trang (bỏ được cả trang phụ lục dạng chữ, mỗi trang giữ lại tốn thêm khoảng
+# 1/4 thời gian OCR); "off" không OCR thử, chỉ bỏ trang trắng.
+TRIAGE = os.environ.get("OCR_TRIAGE", "1") != "0"
+TRIAGE_PROBE = os.environ.get("OCR_TRIAGE_PROBE", "auto")
+TRIAGE_DPI = 72
+TRIAGE_PROBE_DPI = 100
+TRIAGE_BLANK_INK = 0.002     # tỉ lệ điểm ảnh có mực của trang trắng
+TRIAGE_MIN_LINES = 4         # số dòng chữ tối thiểu của trang chữ
+TRIAGE_MAX_GRAPHICS = 0.6    # tỉ lệ hình vẽ tối đa của trang chữ
+INK_LEVEL = 160              # mức xám coi là có mực
+TEXT_ROW_INK = (0.01, 0.5)   # mật độ mực của một hàng điểm ảnh thuộc dòng chữ (trên là đường kẻ)
+TEXT_LINE_HEIGHT = (3, 40)   # chiều cao (điểm ảnh ở TRIAGE_DPI) của một dòng chữ
+
+# Từ khoá (không dấu, chữ thường) của các trang có trường cần trích xuất
+TRIAGE_KEYWORDS = (
+    "thua dat", "to ban do", "dien tich", "so phat hanh", "giay chung nhan", "nguoi su dung",
+    "cccd", "ong:", "ba:", "chi nhanh", "so dia chinh",
+)
+
+SKIPPED = ("blank", "graphics", "annex")
+
+
+# Cấu hình phân loại trang (đưa vào khoá cache OCR)
+def triage_signature():
+    if not TRIAGE:
+        return "off"
+    return f"{TRIAGE_PROBE}:{TRIAGE_BLANK_INK}:{TRIAGE_MIN_LINES}:{TRIAGE_MAX_GRAPHICS}:{TRIAGE_PROBE_DPI}"
+
+
+def _render_gray(page, dpi):
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+# Mật độ mực, số dòng chữ và tỉ lệ hình vẽ của trang (trang fitz)
+def page_signals(page):
+    ink = _render_gray(page, TRIAGE_DPI) < INK_LEVEL
+    row_ink = ink.mean(axis=1)
+    text_rows = (row_ink > TEXT_ROW_INK[0]) & (row_ink <= TEXT_ROW_INK[1])
+    # Vị trí bắt đầu/kết thúc của các dải hàng liên tiếp
+    bounds = np.flatnonzero(np.diff(np.concatenate([[0], text_rows.astype(np.int8), [0]])))
+    lines, line_ink = 0, 0.0
+    for start, end in zip(bounds[::2], bounds[1::2]):
+        if TEXT_LINE_HEIGHT[0] <= end - start <= TEXT_LINE_HEIGHT[1]:
+            lines += 1
+            line_ink += row_ink[start:end].sum()
+    total_ink = row_ink.sum()
+    graphics = 1 - line_ink / total_ink if total_ink else 0.0
+    return {"ink": float(ink.mean()), "lines": lines, "graphics": float(graphics)}
+
+
+# Bỏ dấu tiếng Việt, chữ thường
+def fold(text):
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+# OCR nhanh ở độ phân giải thấp, tìm từ khoá của giấy chứng nhận
+def probe_keywords(page, lang=OCR_LANG):
+    img = Image.fromarray(_render_gray(page, TRIAGE_PROBE_DPI))
+    text = fold(image_to_string(img, lang))
+    img.close()
+    return any(keyword in text for keyword in TRIAGE_KEYWORDS)
+
+
+# "text" (cần OCR đầy đủ), hoặc lý do bỏ qua: "blank", "graphics", "annex"
+def classify_page(page, lang=OCR_LANG):
+    signals = page_signals(page)
+    if signals["ink"] < TRIAGE_BLANK_INK:
+        return "blank"
+    text_like = signals["lines"] >= TRIAGE_MIN_LINES and signals["graphics"] <= TRIAGE_MAX_GRAPHICS
+    if TRIAGE_PROBE == "off" or (text_like and TRIAGE_PROBE != "all"):
+        return "text"
+    if probe_keywords(page, lang):
+        return "text"
+    return "annex" if text_like else "graphics"
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from docx_export import DOCX_TEMPLATE, docx_file_name, write_docx_zip
+from export_writer import EXPORT_FORMATS, export_format, write_rows
+from land_info import EXCEL_COLUMNS, extract_land_info, extract_land_info_for_excel
+
+# Kho lưu kết quả trích xuất lâu dài (SQLite) để tra cứu và xuất lại Excel/DOCX
+# mà không phải OCR lại. Mỗi giấy chứng nhận là một bản ghi, nhận diện theo số
+# phát hành GCN; nếu chưa đọc được số phát hành thì theo (Xã, Tờ, Thửa); không đọc
+# được cả hai thì theo hash nội dung file PDF (source_hash, mọi nơi lưu kết quả đều
+# phải truyền vào) để chạy lại cùng một file không sinh thêm bản ghi. Một thửa
+# có thể có nhiều giấy chứng nhận qua các lần cấp đổi nên (Xã, Tờ, Thửa) không
+# phải khoá duy nhất. Tên, CCCD người sử dụng đất, xã, số phát hành và tên file
+# được đánh chỉ mục toàn văn (FTS5, tìm không dấu).
+#
+#   python parcel_store.py search "nguyen van an"
+#   python parcel_store.py export -o ThongTinThuaDat.xlsx --xa "Tân Lập"
+#   python parcel_store.py docx -o GCN_DOCX.zip --xa "Tân Lập"
+PARCEL_DB = os.environ.get("OCR_PARCEL_DB", os.path.join(".ocr_data", "parcels.sqlite"))
+# Tự lưu kết quả của các app và job chạy nền vào kho (OCR_PARCEL_STORE=0 để tắt)
+PARCEL_STORE = os.environ.get("OCR_PARCEL_STORE", "1") != "0"
+SEARCH_LIMIT = 50
+
+_WORD = re.compile(r"\w+")
+
+
+def connect(db_path=None):
+    db_path = db_path or PARCEL_DB
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS parcels (
+            id INTEGER PRIMARY KEY,
+            xa TEXT NOT NULL,
+            to_ban_do TEXT NOT NULL,
+            thua TEXT NOT NULL,
+            so_phat_hanh TEXT NOT NULL,
+            file_name TEXT,
+            source_hash TEXT,
+            row TEXT NOT NULL,
+            land_info TEXT,
+            nguoi_su_dung TEXT,
+            text TEXT,
+            updated REAL NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS parcels_so_phat_hanh ON parcels (so_phat_hanh) WHERE so_phat_hanh != '';
+        CREATE INDEX IF NOT EXISTS parcels_key ON parcels (xa, to_ban_do, thua);
+        CREATE INDEX IF NOT EXISTS parcels_source ON parcels (source_hash);
+        CREATE VIRTUAL TABLE IF NOT EXISTS parcels_fts USING fts5(
+            owners, cccd, xa, so_phat_hanh, file_name, tokenize = 'unicode61 remove_diacritics 2'
+        );
+    """)
+    return conn
+
+
+# Bỏ dấu "đ" (unicode61 chỉ bỏ dấu thanh, không coi đ là d có dấu)
+def _fold(text):
+    return text.replace("đ", "d").replace("Đ", "D")
+
+
+# Chuẩn hoá giá trị khoá: "Xã Tân  Lập" -> "xã tân lập", "007" -> "7", "CX 123456" -> "CX123456"
+def _text_key(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def _number_key(value):
+    value = "".join(str(value or "").split())
+    return value.lstrip("0") or value
+
+
+def _serial_key(value):
+    return "".join(str(value or "").split()).upper()
+
+
+# Bản ghi lưu vào kho: dòng Excel (cùng cột với sheet ThongTinDat), dữ liệu điền
+# template DOCX và text OCR (để trích xuất lại khi bộ regex được cải tiến)
+def make_record(row, text=None, land_info=None, nguoi_su_dung=None, source_hash=None):
+    if land_info is None and text is not None:
+        land_info, nguoi_su_dung = extract_land_info(text)
+    return {
+        "row": row,
+        "land_info": land_info,
+        "nguoi_su_dung": nguoi_su_dung,
+        "text": text,
+        "source_hash": source_hash,
+    }
+
+
+# Bản ghi đã có của cùng giấy chứng nhận: theo số phát hành, (Xã, Tờ, Thửa), cuối
+# cùng là hash nội dung file
+def _find_existing(conn, xa, to_ban_do, thua, so_phat_hanh, source_hash):
+    if so_phat_hanh:
+        found = conn.execute("SELECT id FROM parcels WHERE so_phat_hanh = ?", (so_phat_hanh,)).fetchone()
+        if found:
+            return found["id"]
+    if xa and to_ban_do and thua:
+        found = conn.execute(
+            "SELECT id FROM parcels WHERE xa = ? AND to_ban_do = ? AND thua = ? AND so_phat_hanh IN ('', ?)",
+            (xa, to_ban_do, thua, so_phat_hanh),
+        ).fetchone()
+        if found:
+            return found["id"]
+    if source_hash:
+        found = conn.execute("SELECT id FROM parcels WHERE source_hash = ?", (source_hash,)).fetchone()
+        if found:
+            return found["id"]
+    return None
+
+
+def _upsert(conn, record, now):
+    row = record["row"]
+    nguoi_su_dung = record["nguoi_su_dung"] or {}
+    xa, to_ban_do = _text_key(row.get("Xã")), _number_key(row.get("Tờ"))
+    thua, so_phat_hanh = _number_key(row.get("Thửa")), _serial_key(row.get("Số phát hành"))
+    values = {
+        "xa": xa, "to_ban_do": to_ban_do, "thua": thua, "so_phat_hanh": so_phat_hanh,
+        "file_name": row.get("Tên file", ""),
+        "source_hash": record["source_hash"],
+        "row": json.dumps(row, ensure_ascii=False),
+        "land_info": json.dumps(record["land_info"], ensure_ascii=False) if record["land_info"] is not None else None,
+        "nguoi_su_dung": json.dumps(nguoi_su_dung, ensure_ascii=False) if record["nguoi_su_dung"] is not None else None,
+        "text": record["text"],
+        "updated": now,
+    }
+    parcel_id = _find_existing(conn, xa, to_ban_do, thua, so_phat_hanh, record["source_hash"])
+    if parcel_id is None:
+        columns = ", ".join(values)
+        parcel_id = conn.execute(
+            f"INSERT INTO parcels ({columns}) VALUES ({', '.join('?' * len(values))})", tuple(values.values())
+        ).lastrowid
+    else:
+        # Lần trích xuất mới không có text/DOCX (vd. từ batch_cli cũ) thì giữ dữ liệu đã lưu
+        values = {column: value for column, value in values.items() if value is not None}
+        columns = ", ".join(f"{column} = ?" for column in values)
+        conn.execute(f"UPDATE parcels SET {columns} WHERE id = ?", (*values.values(), parcel_id))
+        conn.execute("DELETE FROM parcels_fts WHERE rowid = ?", (parcel_id,))
+
+    owners = [row.get("Chủ sở hữu", "")] + [v for k, v in nguoi_su_dung.items() if k.startswith("TenNguoi_")]
+    cccd = [v for k, v in nguoi_su_dung.items() if k.startswith("SoCCCD_")]
+    conn.execute(
+        "INSERT INTO parcels_fts (rowid, owners, cccd, xa, so_phat_hanh, file_name) VALUES (?, ?, ?, ?, ?, ?)",
+        (parcel_id, _fold(" ".join(owners)), " ".join(cccd), _fold(row.get("Xã", "")),
+         f"{row.get('Số phát hành', '')} {so_phat_hanh}", _fold(row.get("Tên file", ""))),
+    )
+    return parcel_id
+
+
+# Thêm hoặc cập nhật nhiều bản ghi (make_record) trong một transaction; trả về số bản ghi
+def upsert_records(records, db_path=None, conn=None):
+    own_conn = conn is None
+    conn = conn or connect(db_path)
+    now = time.time()
+    count = 0
+    try:
+        with conn:
+            # Khoá ghi ngay từ đầu: nhiều tiến trình (pool OCR, job chạy nền) cùng lưu một
+            # giấy chứng nhận thì lần tìm bản ghi cũ và lần thêm mới không bị xen kẽ
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            for record in records:
+                _upsert(conn, record, now)
+                count += 1
+    finally:
+        if own_conn:
+            conn.close()
+    return count
+
+
+# Lưu kết quả của một file (app_single, app_2, app_3, job chạy nền) nếu bật PARCEL_STORE
+def save_result(file_name, text, land_info=None, nguoi_su_dung=None, row=None, source_hash=None, db_path=None):
+    if not PARCEL_STORE:
+        return None
+    row = {**(row or extract_land_info_for_excel(text)), "Tên file": file_name}
+    return upsert_records([make_record(row, text, land_info, nguoi_su_dung, source_hash)], db_path)
+
+
+def _to_record(row):
+    return {
+        "id": row["id"],
+        "row": json.loads(row["row"]),
+        "land_info": json.loads(row["land_info"]) if row["land_info"] else None,
+        "nguoi_su_dung": json.loads(row["nguoi_su_dung"]) if row["nguoi_su_dung"] else None,
+        "text": row["text"],
+        "updated": row["updated"],
+    }
+
+
+# Tìm theo tên, CCCD, xã, số phát hành hoặc tên file; không cần gõ dấu, từ cuối
+# được coi là tiền tố ("nguyen van a" tìm được "Nguyễn Văn An")
+def search(query, limit=SEARCH_LIMIT, db_path=None):
+    terms = _WORD.findall(_fold(query))
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"*' for term in terms)
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT p.* FROM parcels_fts f JOIN parcels p ON p.id = f.rowid "
+            "WHERE parcels_fts MATCH ? ORDER BY f.rank LIMIT ?", (match, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_to_record(row) for row in rows]
+
+
+# Các giấy chứng nhận của một thửa (mới nhất trước)
+def find_parcel(xa, to_ban_do, thua, db_path=None):
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT * FROM parcels WHERE xa = ? AND to_ban_do = ? AND thua = ? ORDER BY updated DESC",
+            (_text_key(xa), _number_key(to_ban_do), _number_key(thua)),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_to_record(row) for row in rows]
+
+
+def find_certificate(so_phat_hanh, db_path=None):
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM parcels WHERE so_phat_hanh = ?", (_serial_key(so_phat_hanh),)).fetchone()
+    finally:
+        conn.close()
+    return _to_record(row) if row else None
+
+
+# Duyệt các bản ghi theo (Xã, Tờ, Thửa), đọc dần từ CSDL để xuất lô lớn không
+# phải giữ hết trong bộ nhớ. xa: lọc theo tên xã (không phân biệt hoa thường)
+def iter_records(xa=None, db_path=None):
+    conn = connect(db_path)
+    try:
+        if xa:
+            rows = conn.execute(
+                "SELECT * FROM parcels WHERE xa = ? ORDER BY xa, CAST(to_ban_do AS INTEGER), CAST(thua AS INTEGER)",
+                (_text_key(xa),),
+            )
+        else:
+            rows = conn.execute("SELECT * FROM parcels ORDER BY xa, CAST(to_ban_do AS INTEGER), CAST(thua AS INTEGER)")
+        for row in rows:
+            yield _to_record(row)
+    finally:
+        conn.close()
+
+
+# Xuất lại bảng kết quả (xlsx, csv, parquet theo đuôi file) từ kho
+def export_rows(records, output_path):
+    return write_rows((record["row"] for record in records), output_path, EXCEL_COLUMNS)
+
+
+# Xuất lại DOCX từ kho; bản ghi chưa có dữ liệu DOCX thì trích xuất lại từ text đã lưu
+def _docx_records(records):
+    for record in records:
+        land_info, nguoi_su_dung = record["land_info"], record["nguoi_su_dung"]
+        if land_info is None:
+            if not record["text"]:
+                continue
+            land_info, nguoi_su_dung = extract_land_info(record["text"])
+        yield docx_file_name(nguoi_su_dung), land_info, nguoi_su_dung
+
+
+def export_docx_zip(records, output, template_path=DOCX_TEMPLATE):
+    return write_docx_zip(_docx_records(records), output, template_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tra cứu và xuất lại kết quả trích xuất đã lưu")
+    parser.add_argument("--db", default=PARCEL_DB, help="File CSDL kho kết quả")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search_parser = commands.add_parser("search", help="Tìm theo tên, CCCD, xã, số phát hành")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    export_parser = commands.add_parser("export", help=f"Xuất bảng kết quả ({', '.join(EXPORT_FORMATS)})")
+    export_parser.add_argument("-o", "--output", default="ThongTinThuaDat.xlsx")
+    export_parser.add_argument("--xa", help="Chỉ xuất các thửa thuộc xã này")
+    docx_parser = commands.add_parser("docx", help="Xuất DOCX theo template, gộp thành file ZIP")
+    docx_parser.add_argument("-o", "--output", default="GCN_DOCX.zip")
+    docx_parser.add_argument("--xa", help="Chỉ xuất các thửa thuộc xã này")
+    docx_parser.add_argument("--template", default=DOCX_TEMPLATE)
+    args = parser.parse_args(argv)
+
+    if args.command == "search":
+        for record in search(args.query, args.limit, args.db):
+            print(json.dumps(record["row"], ensure_ascii=False))
+    elif args.command == "export":
+        try:
+            export_format(args.output)
+        except ValueError as e:
+            parser.error(str(e))
+        count = export_rows(iter_records(args.xa, args.db), args.output)
+        print(f"Đã ghi {count} dòng vào {args.output}", file=sys.stderr)
+    else:
+        count = export_docx_zip(iter_records(args.xa, args.db), args.output, args.template)
+        print(f"Đã ghi {count} file DOCX vào {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
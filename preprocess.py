@@ -0,0 +1,149 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Tiền xử lý ảnh trang trước khi đưa vào Tesseract: xoá dấu mộc đỏ, chuyển ảnh
+# xám, đổi DPI, chỉnh nghiêng, nhị phân hoá thích nghi và xoá viền đen do máy scan.
+# Ảnh nhỏ và sạch hơn giúp OCR nhanh hơn và ít ký tự rác hơn (m°, <t, t3...).
+#
+# Các bước bật/tắt bằng OCR_PREPROCESS (danh sách cách nhau bởi dấu phẩy, để
+# trống để tắt hẳn). Thứ tự thực hiện luôn cố định như PREPROCESS_STEPS; ảnh
+# luôn được chuyển sang ảnh xám khi có ít nhất một bước được bật.
+PREPROCESS_STEPS = ["stamp", "resample", "deskew", "binarize", "border"]
+OCR_PREPROCESS = [
+    step.strip() for step in os.environ.get("OCR_PREPROCESS", ",".join(PREPROCESS_STEPS)).split(",")
+    if step.strip()
+]
+# DPI đưa vào Tesseract; 0 = giữ nguyên DPI lúc render
+OCR_TARGET_DPI = int(os.environ.get("OCR_TARGET_DPI", 0))
+
+# Dấu mộc: điểm ảnh đỏ (hue OpenCV 0-179) đủ đậm
+STAMP_HUE_RANGES = [(0, 10), (170, 179)]
+STAMP_MIN_SATURATION = 80
+STAMP_MIN_VALUE = 60
+
+# Chỉnh nghiêng: dò góc trên ảnh thu nhỏ bằng độ sắc nét của tổng điểm đen theo dòng
+MAX_SKEW = 5.0          # góc nghiêng tối đa được dò (độ)
+MIN_SKEW = 0.2          # nghiêng ít hơn thì không xoay ảnh
+DESKEW_WIDTH = 800      # chiều rộng ảnh thu nhỏ khi dò góc
+
+# Nhị phân hoá thích nghi (ảnh khoảng 200 DPI)
+ADAPTIVE_BLOCK = 31     # kích thước ô lân cận, phải là số lẻ
+ADAPTIVE_C = 15         # hằng số trừ đi khỏi ngưỡng trung bình
+
+# Viền scan: dòng/cột trong dải sát mép có tỉ lệ điểm đen cao hơn BORDER_INK
+BORDER_BAND = 0.05      # độ rộng dải sát mép được kiểm tra (tỉ lệ kích thước ảnh)
+BORDER_INK = 0.5
+
+
+# Chuỗi mô tả cấu hình tiền xử lý, đưa vào khoá cache OCR
+def preprocess_signature(steps=None, target_dpi=None):
+    steps = OCR_PREPROCESS if steps is None else steps
+    target_dpi = OCR_TARGET_DPI if target_dpi is None else target_dpi
+    enabled = [step for step in PREPROCESS_STEPS if step in steps]
+    if not enabled:
+        return "none"
+    return f"{','.join(enabled)}|{target_dpi}|{ADAPTIVE_BLOCK}|{ADAPTIVE_C}|{MAX_SKEW}"
+
+
+# Đổi các điểm ảnh đỏ (dấu mộc, chữ ký mực đỏ) thành nền trắng
+def remove_stamps(rgb):
+    hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+    mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    for low, high in STAMP_HUE_RANGES:
+        mask |= cv2.inRange(hsv, (low, STAMP_MIN_SATURATION, STAMP_MIN_VALUE), (high, 255, 255))
+    rgb[mask > 0] = 255
+    return rgb
+
+
+def resample(gray, dpi, target_dpi):
+    scale = target_dpi / dpi
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def _rotate(img, angle, border_value, interpolation=cv2.INTER_LINEAR):
+    height, width = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (width, height), flags=interpolation, borderValue=border_value)
+
+
+# Độ sắc nét của tổng điểm đen theo dòng: lớn nhất khi các dòng chữ nằm ngang
+def _profile_score(ink, angle):
+    rows = _rotate(ink, angle, 0, cv2.INTER_NEAREST).sum(axis=1, dtype=np.float64)
+    return float(np.square(np.diff(rows)).sum())
+
+
+# Dò góc xoay (độ) để các dòng chữ nằm ngang: dò thô từng 1 độ rồi dò tinh 0.1 độ
+def estimate_skew(gray):
+    scale = min(1.0, DESKEW_WIDTH / gray.shape[1])
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    coarse = max(np.arange(-MAX_SKEW, MAX_SKEW + 0.5, 1.0), key=lambda angle: _profile_score(ink, angle))
+    fine = max(np.arange(coarse - 1.0, coarse + 1.05, 0.1), key=lambda angle: _profile_score(ink, angle))
+    return float(fine)
+
+
+def deskew(gray):
+    angle = estimate_skew(gray)
+    if abs(angle) < MIN_SKEW:
+        return gray
+    return _rotate(gray, angle, 255)
+
+
+def binarize(gray):
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, ADAPTIVE_BLOCK, ADAPTIVE_C
+    )
+
+
+# Số dòng (hoặc cột) tính từ mép thuộc viền đen
+def _border_width(ink_ratios):
+    limit = int(len(ink_ratios) * BORDER_BAND)
+    dark = np.nonzero(ink_ratios[:limit] > BORDER_INK)[0]
+    return int(dark[-1]) + 1 if len(dark) else 0
+
+
+# Tô trắng các dải viền đen sát mép ảnh (bóng mép giấy, nắp máy scan)
+def remove_borders(gray):
+    ink = gray < 128
+    rows = ink.mean(axis=1)
+    cols = ink.mean(axis=0)
+    top, bottom = _border_width(rows), _border_width(rows[::-1])
+    left, right = _border_width(cols), _border_width(cols[::-1])
+    height, width = gray.shape
+    gray[:top] = 255
+    gray[height - bottom:] = 255
+    gray[:, :left] = 255
+    gray[:, width - right:] = 255
+    return gray
+
+
+# Tiền xử lý một ảnh trang (PIL) đã render ở `dpi`; trả về ảnh PIL mới (ảnh xám)
+# hoặc chính ảnh đầu vào nếu tắt tiền xử lý
+def preprocess_image(img, dpi=None, steps=None, target_dpi=None):
+    steps = OCR_PREPROCESS if steps is None else steps
+    target_dpi = OCR_TARGET_DPI if target_dpi is None else target_dpi
+    if not any(step in steps for step in PREPROCESS_STEPS):
+        return img
+
+    if img.mode == "L":
+        gray = np.array(img)
+    else:
+        rgb = np.array(img.convert("RGB"))
+        if "stamp" in steps:
+            rgb = remove_stamps(rgb)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        del rgb
+
+    if "resample" in steps and target_dpi and dpi and target_dpi != dpi:
+        gray = resample(gray, dpi, target_dpi)
+    if "deskew" in steps:
+        gray = deskew(gray)
+    if "binarize" in steps:
+        gray = binarize(gray)
+    if "border" in steps:
+        gray = remove_borders(gray)
+    return Image.fromarray(gray)
@@ -0,0 +1,160 @@
+import json
+import os
+
+import metrics
+from ocr_backend import image_to_data, image_to_string
+from ocr_engine import OCR_DPI, OCR_LANG, pdf_source, plan_pages, render_pages
+from preprocess import preprocess_image
+
+# OCR theo vùng: chỉ đọc các dải ảnh quanh những nhãn cần thiết thay vì cả trang.
+# Vị trí nhãn được tìm một lần bằng image_to_data trên ảnh thu nhỏ, hoặc lấy
+# từ file cấu hình bố cục (OCR_LAYOUT_PROFILE) khi biết trước mẫu giấy chứng nhận:
+# OCR_LAYOUT_TEMPLATE là tên mẫu trong file đó được dùng mặc định (để trống thì dò nhãn).
+
+# Nhóm vùng -> (các từ khoá nhận diện dòng nhãn, số dòng cần đọc sau dòng nhãn)
+ROI_ANCHORS = {
+    "thua_dat": (("thửa", "tờ bản", "diện tích"), 2),
+    "nguoi_su_dung": (("ông:", "bà:", "cccd"), 1),
+    "chi_nhanh": (("chi nhánh",), 8),
+}
+ANCHOR_SCALE = 0.5      # tỉ lệ thu nhỏ ảnh khi dò nhãn
+ROI_MARGIN = 0.5        # lề thêm phía trên dải (tính theo chiều cao dòng)
+ROI_PSM = 6             # mỗi vùng cắt là một khối văn bản
+
+OCR_LAYOUT_PROFILE = os.environ.get("OCR_LAYOUT_PROFILE", "")
+OCR_LAYOUT_TEMPLATE = os.environ.get("OCR_LAYOUT_TEMPLATE", "")
+_layout_profiles = None
+
+
+# Đọc cấu hình bố cục: {"<tên mẫu>": {"<nhóm>": [[x0, y0, x1, y1], ...]}} với toạ độ
+# tính theo tỉ lệ chiều rộng/chiều cao trang
+def load_layout_profiles(path=None):
+    global _layout_profiles
+    path = path or OCR_LAYOUT_PROFILE
+    if not path:
+        return {}
+    if _layout_profiles is None:
+        with open(path, encoding="utf-8") as f:
+            _layout_profiles = json.load(f)
+    return _layout_profiles
+
+
+# Cấu hình bố cục của mẫu `template`; báo lỗi khi tên mẫu không có trong file cấu hình
+# để cấu hình sai không âm thầm quay về dò nhãn
+def layout_profile(template):
+    profiles = load_layout_profiles()
+    if template not in profiles:
+        source = OCR_LAYOUT_PROFILE or "OCR_LAYOUT_PROFILE chưa đặt"
+        raise ValueError(f"Không có mẫu bố cục '{template}' trong file cấu hình bố cục ({source})")
+    return profiles[template]
+
+
+# Gom kết quả image_to_data thành từng dòng theo thứ tự đọc của Tesseract:
+# (text, left, top, right, bottom, độ tin cậy trung bình của các từ), toạ độ chia cho `scale`
+def data_lines(data, scale=1.0):
+    lines = {}
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        left, top = data["left"][i] / scale, data["top"][i] / scale
+        right, bottom = left + data["width"][i] / scale, top + data["height"][i] / scale
+        conf = float(data["conf"][i])
+        if key in lines:
+            text, l, t, r, b, confs = lines[key]
+            lines[key] = (f"{text} {word}", min(l, left), min(t, top), max(r, right), max(b, bottom), confs + [conf])
+        else:
+            lines[key] = (word, left, top, right, bottom, [conf])
+    return [(text, l, t, r, b, sum(confs) / len(confs)) for text, l, t, r, b, confs in lines.values()]
+
+
+# Các dòng của ảnh trang (dò trên ảnh thu nhỏ), sắp xếp từ trên xuống
+def detect_lines(img, lang=OCR_LANG, scale=ANCHOR_SCALE):
+    small = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+    data = image_to_data(small, lang)
+    small.close()
+    return sorted(data_lines(data, scale), key=lambda line: line[2])
+
+
+# Các dải (nhóm vùng, top, bottom) quanh từng dòng nhãn; `lines` sắp xếp từ trên xuống,
+# `height` là chiều cao ảnh trang
+def anchor_regions(lines, height):
+    regions = []
+    for index, (text, _, top, _, bottom, _) in enumerate(lines):
+        lowered = text.lower()
+        for group, (keywords, extra_lines) in ROI_ANCHORS.items():
+            if any(keyword in lowered for keyword in keywords):
+                line_height = bottom - top
+                last = lines[min(index + extra_lines, len(lines) - 1)]
+                regions.append((
+                    group,
+                    max(0, int(top - line_height * ROI_MARGIN)),
+                    min(height, int(max(bottom, last[4]) + line_height * ROI_MARGIN)),
+                ))
+                break
+    return regions
+
+
+# Tìm các dải (top, bottom) chứa nhãn cần thiết trên trang
+def find_regions(img, lang=OCR_LANG):
+    regions = anchor_regions(detect_lines(img, lang), img.height)
+    return merge_regions((top, bottom) for _, top, bottom in regions)
+
+
+# Vùng lấy từ cấu hình bố cục, đổi sang pixel
+def profile_regions(img, profile):
+    boxes = []
+    for group_boxes in profile.values():
+        for x0, y0, x1, y1 in group_boxes:
+            boxes.append((int(x0 * img.width), int(y0 * img.height), int(x1 * img.width), int(y1 * img.height)))
+    return sorted(boxes, key=lambda box: box[1])
+
+
+# Gộp các dải chồng lấn để không OCR một vùng hai lần
+def merge_regions(regions):
+    merged = []
+    for top, bottom in sorted(regions):
+        if merged and top <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], bottom))
+        else:
+            merged.append((top, bottom))
+    return merged
+
+
+# OCR các vùng của một ảnh trang, nối lại theo thứ tự từ trên xuống
+def ocr_regions(img, lang=OCR_LANG, profile=None):
+    if profile:
+        boxes = profile_regions(img, profile)
+    else:
+        boxes = [(0, top, img.width, bottom) for top, bottom in find_regions(img, lang)]
+    texts = []
+    for box in boxes:
+        crop = img.crop(box)
+        texts.append(image_to_string(crop, lang, psm=ROI_PSM))
+        crop.close()
+    return "\n".join(texts)
+
+
+# Trích xuất text theo vùng, từng trang một; dừng sớm khi is_complete(text) trả về
+# True (đã đủ các trường bắt buộc) nên các trang còn lại không cần render
+def extract_roi_text(pdf, is_complete=None, dpi=OCR_DPI, lang=OCR_LANG, template=OCR_LAYOUT_TEMPLATE):
+    source = pdf_source(pdf)
+    profile = layout_profile(template) if template else None
+    text = ""
+    pages = plan_pages(source)
+    metrics.set_pages(len(pages))
+    for page in pages:
+        if page["text"] is None:
+            rendered = render_pages(source, page["page"], page["page"], dpi)[0]
+            # Tiền xử lý cả trang một lần trước khi dò nhãn và cắt vùng
+            with metrics.stage("preprocess", pages=1):
+                img = preprocess_image(rendered, dpi)
+            if img is not rendered:
+                rendered.close()
+            with metrics.stage("ocr", pages=1):
+                page["text"] = ocr_regions(img, lang, profile)
+            img.close()
+        text += page["text"] + "\n"
+        if is_complete is not None and is_complete(text):
+            break
+    return text
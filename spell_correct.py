@@ -0,0 +1,109 @@
+import os
+import re
+import sys
+import threading
+import warnings
+from functools import lru_cache
+
+from symspellpy import SymSpell, Verbosity
+
+from field_extraction import LABELS
+
+# Sửa lỗi chính tả (SymSpell) cho giá trị các trường đã trích xuất, không sửa cả
+# văn bản OCR: regex trích xuất cần giữ nguyên nhãn và dấu tiếng Việt, còn số
+# thửa, CCCD, ngày tháng không phải từ trong từ điển.
+#
+# Từ điển được nạp một lần cho mỗi tiến trình từ file index dựng sẵn
+# (SymSpell.save_pickle), nhanh hơn nhiều so với load_dictionary từ file text:
+#
+#   python spell_correct.py vietnamese.txt vietnamese.pickle
+#
+# Không có cả index lẫn file từ điển thì bỏ qua bước sửa chính tả (có cảnh báo),
+# giá trị các trường giữ nguyên như kết quả trích xuất.
+SPELL_DICTIONARY = os.environ.get("SPELL_DICTIONARY", "vietnamese.txt")
+SPELL_INDEX = os.environ.get("SPELL_INDEX", "vietnamese.pickle")
+SPELL_MAX_EDIT_DISTANCE = 2
+SPELL_CACHE_SIZE = 65536    # số từ được nhớ kết quả tra cứu
+
+# Các trường văn bản tự do cần sửa chính tả. Không sửa số, ngày, số phát hành và
+# các trường toàn danh từ riêng (tên người, địa chỉ thửa đất và người sử dụng):
+# tên xã, thôn không có trong từ điển nên dễ bị "sửa" thành một từ thông dụng.
+SPELL_FIELDS = ["LoaiDat", "HinhThucSuDung", "ThoiHanSuDung", "NguonGocSuDung", "NoiDung"]
+
+# Từ thuộc các nhãn đã biết: giữ nguyên
+LABEL_WORDS = {
+    word for labels in LABELS.values() for label in labels
+    for word in re.findall(r"\w+", label.lower())
+}
+
+_WORD = re.compile(r"\w+")
+
+_sym_spell = None
+_unavailable = False
+_lock = threading.Lock()
+
+
+# Dựng index từ file từ điển "từ tần_suất" và lưu lại dạng pickle
+def build_index(dictionary_path=None, index_path=None):
+    sym_spell = SymSpell(max_dictionary_edit_distance=SPELL_MAX_EDIT_DISTANCE)
+    if not sym_spell.load_dictionary(dictionary_path or SPELL_DICTIONARY, term_index=0, count_index=1, encoding="utf-8"):
+        raise FileNotFoundError(dictionary_path or SPELL_DICTIONARY)
+    sym_spell.save_pickle(index_path or SPELL_INDEX)
+    return sym_spell
+
+
+# SymSpell dùng chung trong tiến trình; nạp từ index, chưa có index thì dựng từ
+# file từ điển và lưu index cho lần sau. Trả về None nếu không có từ điển.
+def get_sym_spell():
+    global _sym_spell, _unavailable
+    if _sym_spell is None and not _unavailable:
+        with _lock:
+            if _sym_spell is None and not _unavailable:
+                if os.path.exists(SPELL_INDEX):
+                    sym_spell = SymSpell(max_dictionary_edit_distance=SPELL_MAX_EDIT_DISTANCE)
+                    sym_spell.load_pickle(SPELL_INDEX)
+                    _sym_spell = sym_spell
+                else:
+                    try:
+                        _sym_spell = build_index()
+                    except FileNotFoundError as e:
+                        _unavailable = True
+                        warnings.warn(f"Không tìm thấy từ điển chính tả {e}, bỏ qua bước sửa chính tả")
+    return _sym_spell
+
+
+@lru_cache(maxsize=SPELL_CACHE_SIZE)
+def correct_word(word):
+    suggestions = get_sym_spell().lookup(
+        word, Verbosity.TOP, max_edit_distance=SPELL_MAX_EDIT_DISTANCE, transfer_casing=True
+    )
+    return suggestions[0].term if suggestions else word
+
+
+def _correct_match(match):
+    word = match.group()
+    if any(ch.isdigit() for ch in word) or len(word) < 2 or word.lower() in LABEL_WORDS:
+        return word
+    return correct_word(word)
+
+
+# Sửa từng từ trong một giá trị, giữ nguyên dấu câu và khoảng trắng
+def correct_spelling(text):
+    if get_sym_spell() is None:
+        return text
+    return _WORD.sub(_correct_match, text)
+
+
+# Sửa chính tả các trường văn bản tự do của kết quả extract_land_info; thông tin
+# người sử dụng đất (tên, CCCD, địa chỉ) giữ nguyên
+def correct_land_info(land_info, nguoi_su_dung):
+    land_info = {
+        key: correct_spelling(value) if key in SPELL_FIELDS else value
+        for key, value in land_info.items()
+    }
+    return land_info, nguoi_su_dung
+
+
+if __name__ == "__main__":
+    build_index(*sys.argv[1:3])
+    print(f"Đã lưu index từ điển vào {sys.argv[2] if len(sys.argv) > 2 else SPELL_INDEX}")
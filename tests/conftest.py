@@ -0,0 +1,57 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# Cache OCR, job chạy nền, kho kết quả và log metrics của lần chạy test nằm trong
+# một thư mục tạm. Phải đặt trước khi import các module (cấu hình đọc từ biến môi
+# trường lúc import); tiến trình con của pool OCR cũng nhận các biến này.
+TEST_DIR = tempfile.mkdtemp(prefix="ocr_tests_")
+os.environ["OCR_CACHE_DIR"] = os.path.join(TEST_DIR, "cache")
+os.environ["OCR_JOB_DIR"] = os.path.join(TEST_DIR, "jobs")
+os.environ["OCR_PARCEL_DB"] = os.path.join(TEST_DIR, "parcels.sqlite")
+os.environ["OCR_METRICS_LOG"] = os.path.join(TEST_DIR, "metrics.log")
+os.environ["OCR_CORRECTIONS_FILE"] = os.path.join(TEST_DIR, "ocr_corrections.json")
+os.environ["OCR_WORKERS"] = "2"
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import fitz  # noqa: E402
+import pytest  # noqa: E402
+
+# Font có đủ chữ tiếng Việt để ghi lớp text của PDF giả lập (cùng font với benchmarks)
+TEST_FONT = os.environ.get("BENCH_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+CERTIFICATE_LINES = [
+    "GIẤY CHỨNG NHẬN QUYỀN SỬ DỤNG ĐẤT",
+    "Ông: Nguyễn Văn An, CCCD số: 001234567890, Địa chỉ: xã Tân Lập, huyện Phú Xuyên.",
+    "Thửa đất số: 12, tờ bản đồ số: 5",
+    "Diện tích: 120.5 m²",
+    "Loại đất: Đất ở tại nông thôn.",
+    "Địa chỉ: thôn 3, xã Tân Lập, huyện Phú Xuyên",
+    "CHI NHÁNH VĂN PHÒNG ĐĂNG KÝ ĐẤT ĐAI",
+    "CX 123456",
+]
+
+
+# PDF một trang có lớp text (không cần Tesseract để trích xuất)
+def make_pdf(lines=CERTIFICATE_LINES):
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_text((50, 60), list(lines), fontname="dejavu", fontfile=TEST_FONT, fontsize=10)
+        return doc.tobytes()
+
+
+@pytest.fixture
+def certificate_pdf():
+    if not os.path.exists(TEST_FONT):
+        pytest.skip(f"Không có font {TEST_FONT} (đặt BENCH_FONT)")
+    return make_pdf()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    import ocr_engine
+    if ocr_engine._pool is not None:
+        ocr_engine._pool.shutdown(cancel_futures=True)
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
@@ -0,0 +1,141 @@
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api_server
+from parcel_store import find_certificate
+
+
+@pytest.fixture(scope="module")
+def server():
+    api_server.start_batcher()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), api_server.ApiHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(*server, timeout=120)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+    finally:
+        conn.close()
+    if response.getheader("Content-Type", "").startswith("application/json"):
+        data = json.loads(data)
+    return response, data
+
+
+def test_healthz(server):
+    response, data = request(server, "GET", "/healthz")
+    assert response.status == 200
+    assert data["status"] == "ok"
+    assert data["max_requests"] == api_server.API_MAX_REQUESTS
+    assert data["queued_files"] == 0
+
+
+def test_extract(server, certificate_pdf):
+    response, data = request(server, "POST", "/extract?name=gcn.pdf&mode=full", certificate_pdf)
+    assert response.status == 200, data
+    assert data["file"] == "gcn.pdf"
+    assert data["row"]["Thửa"] == "12"
+    assert data["row"]["Số phát hành"] == "CX 123456"
+    assert data["row"]["Tên file"] == "gcn.pdf"
+    assert data["nguoi_su_dung"]["TenNguoi_1"] == "Nguyễn Văn An"
+    assert data["land_info"]["SoToBanDo"] == "5"
+    assert data["metrics"]["pages"] == 1
+    assert "text" not in data
+    assert find_certificate("CX123456")["row"]["Tên file"] == "gcn.pdf"
+
+
+def test_extract_with_text(server, certificate_pdf):
+    response, data = request(server, "POST", "/extract?text=1", certificate_pdf)
+    assert response.status == 200, data
+    assert data["file"] == "upload.pdf"
+    assert "Thửa đất số: 12" in data["text"]
+
+
+def test_concurrent_requests_are_batched(server, certificate_pdf):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda index: request(server, "POST", f"/extract?name={index}.pdf", certificate_pdf), range(4)
+        ))
+    assert [response.status for response, _ in results] == [200] * 4
+    assert sorted(data["file"] for _, data in results) == [f"{index}.pdf" for index in range(4)]
+    assert all(data["row"]["Thửa"] == "12" for _, data in results)
+
+
+def test_metrics(server, certificate_pdf):
+    request(server, "POST", "/extract", certificate_pdf)
+    response, data = request(server, "GET", "/metrics")
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/plain")
+    text = data.decode("utf-8")
+    assert "# TYPE ocr_documents_total counter" in text
+    assert "ocr_documents_total 0\n" not in text
+
+
+def test_get_extract_not_allowed(server):
+    response, data = request(server, "GET", "/extract")
+    assert response.status == 405
+    assert response.getheader("Allow") == "POST"
+    assert data["error"]
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_unknown_path(server, method):
+    response, data = request(server, method, "/khong-co", b"x" if method == "POST" else None)
+    assert response.status == 404
+    assert data["error"]
+
+
+def test_empty_body(server):
+    response, data = request(server, "POST", "/extract", b"")
+    assert response.status == 400
+    assert "Thiếu nội dung" in data["error"]
+
+
+def test_body_too_large(server, monkeypatch):
+    monkeypatch.setattr(api_server, "API_MAX_BYTES", 1024)
+    response, data = request(server, "POST", "/extract", b"%PDF" + b"x" * 2048)
+    assert response.status == 413
+    assert data["error"]
+
+
+def test_busy(server, certificate_pdf, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(api_server, "_slots", slots)
+    monkeypatch.setattr(api_server, "API_QUEUE_SECONDS", 0.1)
+    response, data = request(server, "POST", "/extract", certificate_pdf)
+    assert response.status == 503
+    assert response.getheader("Retry-After") == "1"
+    assert data["error"]
+
+
+@pytest.mark.parametrize("path, body, message", [
+    ("/extract?mode=nhanh", b"%PDF-1.7\n", "mode phải là"),
+    ("/extract", b"khong phai pdf", "không phải file PDF"),
+    ("/extract", b"%PDF-1.7\nfile hong", "Không đọc được file PDF"),
+])
+def test_bad_request(server, path, body, message):
+    response, data = request(server, "POST", path, body)
+    assert response.status == 400
+    assert message in data["error"]
+
+
+def test_slots_released_after_errors(server, certificate_pdf):
+    for _ in range(api_server.API_MAX_REQUESTS + 1):
+        request(server, "POST", "/extract", b"khong phai pdf")
+    response, _ = request(server, "POST", "/extract", certificate_pdf)
+    assert response.status == 200
+    assert request(server, "GET", "/healthz")[1]["active_requests"] == 0
@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_DIR", str(tmp_path))
+    monkeypatch.setattr(job_queue, "JOB_DB", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(job_queue, "_resumed", False)
+    job_queue.init_db()
+    return job_queue
+
+
+def wait_for_job(job_id, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = job_queue.get_job(job_id, with_text=True)
+        if job["done"]:
+            return job
+        time.sleep(0.2)
+    pytest.fail(f"Job {job_id} chưa xong sau {timeout}s")
+
+
+def insert_job(conn, job_id, mode, files):
+    conn.execute("INSERT INTO jobs (id, mode, created) VALUES (?, ?, ?)", (job_id, mode, time.time()))
+    conn.executemany("INSERT INTO job_files (job_id, idx, name, path, status) VALUES (?, ?, ?, ?, ?)",
+                     [(job_id, index, name, path, status) for index, (name, path, status) in enumerate(files)])
+
+
+def test_submit_job_runs_every_file(jobs, certificate_pdf):
+    job_id = jobs.submit_job([certificate_pdf, certificate_pdf], mode="full")
+    job = wait_for_job(job_id)
+    assert job["mode"] == "full"
+    assert [f["status"] for f in job["files"]] == ["ok", "ok"], [f["error"] for f in job["files"]]
+    for f in job["files"]:
+        assert f["pages_done"] == f["pages_total"] == 1
+        assert f["row"]["Thửa"] == "12"
+        assert f["row"]["Số phát hành"] == "CX 123456"
+        assert "Nguyễn Văn An" in f["text"]
+        assert f["metrics"] is not None
+
+
+def test_get_job_without_text(jobs, certificate_pdf):
+    job_id = jobs.submit_job([certificate_pdf])
+    wait_for_job(job_id)
+    job = jobs.get_job(job_id)
+    assert job["done"]
+    assert job["files"][0]["text"] is None
+    assert jobs.get_job("khong-co") is None
+
+
+def test_broken_pdf_is_reported_per_file(jobs, certificate_pdf):
+    job_id = jobs.submit_job([b"khong phai pdf", certificate_pdf])
+    job = wait_for_job(job_id)
+    assert [f["status"] for f in job["files"]] == ["error", "ok"]
+    assert job["files"][0]["error"]
+
+
+def test_batch_larger_than_queue_is_rejected(jobs, certificate_pdf, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_QUEUE_MAX", 1)
+    with pytest.raises(job_queue.QueueFull, match="tối đa 1 file"):
+        jobs.submit_job([certificate_pdf, certificate_pdf])
+    with job_queue.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+
+
+def test_full_queue_is_rejected(jobs, certificate_pdf, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_QUEUE_MAX", 2)
+    # Không gửi lại các file giả lập đang chờ
+    monkeypatch.setattr(job_queue, "_resumed", True)
+    with job_queue.connect() as conn:
+        insert_job(conn, "dang-cho", "full", [("a.pdf", "a.pdf", "queued"), ("b.pdf", "b.pdf", "running")])
+    with pytest.raises(job_queue.QueueFull, match="Hàng đợi đang có 2 file"):
+        jobs.submit_job([certificate_pdf])
+    with job_queue.connect() as conn:
+        assert job_queue.queue_depth(conn) == 2
+        conn.execute("UPDATE job_files SET status = 'ok'")
+    job_id = jobs.submit_job([certificate_pdf])
+    assert wait_for_job(job_id)["files"][0]["status"] == "ok"
+
+
+def test_unfinished_files_are_resumed(jobs, certificate_pdf, tmp_path):
+    path = tmp_path / "0.pdf"
+    path.write_bytes(certificate_pdf)
+    with job_queue.connect() as conn:
+        insert_job(conn, "bi-ngat", "full", [("gcn.pdf", str(path), "running"), ("xong.pdf", "xong.pdf", "ok")])
+        conn.execute("UPDATE job_files SET pages_total = 1, pages_done = 1 WHERE status = 'running'")
+    job = wait_for_job("bi-ngat")
+    assert [f["status"] for f in job["files"]] == ["ok", "ok"], [f["error"] for f in job["files"]]
+    assert job["files"][0]["name"] == "gcn.pdf"
+    assert job["files"][0]["row"]["Thửa"] == "12"
+    # Chỉ gửi lại một lần trong mỗi tiến trình
+    assert job_queue._resumed
+    assert os.path.exists(path)
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+import parcel_store
+from conftest import CERTIFICATE_LINES
+from parcel_store import find_certificate, find_parcel, iter_records, make_record, save_result, search, upsert_records
+
+CERTIFICATE_TEXT = "\n".join(CERTIFICATE_LINES)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "parcels.sqlite")
+
+
+def make_row(owner="Nguyễn Văn An", thua="12", to="5", xa="Xã Tân Lập", serial="CX 123456", file_name="a.pdf"):
+    return {"Chủ sở hữu": owner, "Thửa": thua, "Tờ": to, "Diện tích": "120.5", "Xã": xa,
+            "Số phát hành": serial, "Tên file": file_name}
+
+
+def count(db):
+    return len(list(iter_records(db_path=db)))
+
+
+def test_save_result_extracts_from_text(db):
+    save_result("gcn.pdf", CERTIFICATE_TEXT, source_hash="h1", db_path=db)
+    record = find_certificate("CX123456", db_path=db)
+    assert record["row"]["Thửa"] == "12"
+    assert record["row"]["Tên file"] == "gcn.pdf"
+    assert record["nguoi_su_dung"]["SoCCCD_1"] == "001234567890"
+    assert record["land_info"]["SoToBanDo"] == "5"
+    assert record["text"] == CERTIFICATE_TEXT
+
+
+def test_same_serial_updates_record(db):
+    upsert_records([make_record(make_row(file_name="a.pdf"), source_hash="h1")], db)
+    upsert_records([make_record(make_row(file_name="b.pdf", serial="cx123456"), source_hash="h2")], db)
+    assert count(db) == 1
+    assert find_certificate("CX 123456", db_path=db)["row"]["Tên file"] == "b.pdf"
+
+
+def test_new_certificate_for_same_parcel_is_kept(db):
+    upsert_records([make_record(make_row(serial="CX 123456"), source_hash="h1")], db)
+    upsert_records([make_record(make_row(serial="CY 654321"), source_hash="h2")], db)
+    assert count(db) == 2
+    assert len(find_parcel("xã tân  lập", "05", "012", db_path=db)) == 2
+
+
+def test_parcel_key_without_serial(db):
+    upsert_records([make_record(make_row(serial=""), source_hash="h1")], db)
+    upsert_records([make_record(make_row(serial="", xa="Xã  Tân Lập", thua="012"), source_hash="h2")], db)
+    assert count(db) == 1
+    # Đọc được số phát hành ở lần sau thì cập nhật cùng bản ghi
+    upsert_records([make_record(make_row(), source_hash="h3")], db)
+    assert count(db) == 1
+    assert find_certificate("CX123456", db_path=db) is not None
+
+
+def test_source_hash_without_keys(db):
+    empty = make_row(owner="", thua="", to="", xa="", serial="")
+    upsert_records([make_record(empty, text="khong doc duoc", source_hash="h1")], db)
+    upsert_records([make_record(empty, text="khong doc duoc", source_hash="h1")], db)
+    upsert_records([make_record(empty, text="khong doc duoc", source_hash="h2")], db)
+    assert count(db) == 2
+
+
+def test_update_keeps_stored_text(db):
+    upsert_records([make_record(make_row(), text=CERTIFICATE_TEXT, source_hash="h1")], db)
+    upsert_records([make_record(make_row(file_name="b.pdf"))], db)
+    record = find_certificate("CX123456", db_path=db)
+    assert record["text"] == CERTIFICATE_TEXT
+    assert record["row"]["Tên file"] == "b.pdf"
+
+
+@pytest.mark.parametrize("query", [
+    "nguyen van a",
+    "Nguyễn Văn An",
+    "NGUYEN VAN",
+    "tan lap",
+    "001234567890",
+    "CX123456",
+    "cx 123456",
+])
+def test_search_without_accents(db, query):
+    save_result("gcn.pdf", CERTIFICATE_TEXT, source_hash="h1", db_path=db)
+    save_result("khac.pdf", CERTIFICATE_TEXT.replace("Nguyễn Văn An", "Trần Thị Bình")
+                .replace("Tân Lập", "Phú Túc").replace("CX 123456", "CY 654321")
+                .replace("001234567890", "009876543210"), source_hash="h2", db_path=db)
+    results = search(query, db_path=db)
+    assert [record["row"]["Tên file"] for record in results] == ["gcn.pdf"]
+
+
+def test_search_folds_d(db):
+    upsert_records([make_record(make_row(owner="Đỗ Đức Định", xa="Xã Đại Đồng"), source_hash="h1")], db)
+    assert len(search("do duc dinh", db_path=db)) == 1
+    assert len(search("dai dong", db_path=db)) == 1
+    assert len(search("Đỗ Đức", db_path=db)) == 1
+
+
+def test_search_reindexes_updated_record(db):
+    upsert_records([make_record(make_row(owner="Nguyễn Văn An"), source_hash="h1")], db)
+    upsert_records([make_record(make_row(owner="Lê Văn Cường"), source_hash="h1")], db)
+    assert search("nguyen", db_path=db) == []
+    assert len(search("le van cuong", db_path=db)) == 1
+
+
+def test_search_empty_query(db):
+    upsert_records([make_record(make_row(), source_hash="h1")], db)
+    assert search(" , ", db_path=db) == []
+
+
+def test_store_disabled(db, monkeypatch):
+    monkeypatch.setattr(parcel_store, "PARCEL_STORE", False)
+    assert save_result("gcn.pdf", CERTIFICATE_TEXT, db_path=db) is None
+    assert count(db) == 0
+
+
+def test_concurrent_saves_of_same_certificate(db):
+    upsert_records([], db)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def worker(index):
+        barrier.wait()
+        try:
+            upsert_records([make_record(make_row(file_name=f"{index}.pdf"), source_hash=f"h{index}")], db)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert count(db) == 1
@@ -0,0 +1,62 @@
+import random
+import re
+
+import pytest
+
+from text_normalize import DEFAULT_CORRECTIONS, NormalizedText, compile_corrections, normalize_text
+
+# clean_text trước khi dùng text_normalize (chưa có quy tắc giữ "năm 2")
+LEGACY_CORRECTIONS = {wrong: right for wrong, right in DEFAULT_CORRECTIONS.items() if wrong != "năm 2"}
+FUZZ_PIECES = list(DEFAULT_CORRECTIONS) + [" ", "  ", "\n", "\t", "\r", "\xa0", "a", "2", ".", "m", "tháng", "năm"]
+
+
+def legacy_clean_text(text):
+    for wrong, right in LEGACY_CORRECTIONS.items():
+        text = text.replace(wrong, right)
+    lines = text.split("\n")
+    cleaned_lines = [re.sub(r"\s+", " ", line).strip() for line in lines if line.strip()]
+    return "\n".join(cleaned_lines).strip()
+
+
+@pytest.mark.parametrize("text", [
+    "Diện tích: 120 m°\n\n  Loại đất:\tĐất ở  ",
+    "Ông: A, CCCD sô: 0123\nGCN: CX 123456",
+    "ngày <t3 tháng . 5 năm: 2020",
+    "120 m  2",
+    "tháng  .",
+    "<²tháng .\t",
+    "m°2 lôai địạ",
+    "",
+    " \n \t\n",
+])
+def test_matches_legacy_clean_text(text):
+    assert normalize_text(text) == legacy_clean_text(text)
+
+
+def test_matches_legacy_on_random_strings():
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randrange(1, 12)))
+        if "năm 2" in text:
+            continue
+        assert normalize_text(text) == legacy_clean_text(text), repr(text)
+
+
+def test_keeps_year_after_nam():
+    assert normalize_text("ngày 5 tháng 6 năm 2002, 120 m 2") == "ngày 5 tháng 6 năm 2002, 120 m"
+
+
+def test_second_call_returns_same_text():
+    rng = random.Random(1)
+    for _ in range(5000):
+        text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randrange(1, 12)))
+        normalized = normalize_text(text)
+        assert isinstance(normalized, NormalizedText)
+        again = normalize_text(normalized)
+        assert again is normalized
+        assert again == normalized
+
+
+def test_extra_corrections_in_order():
+    compiled = compile_corrections({"a": "b", "b": "c", "xay": "xay"})
+    assert normalize_text("a xay  b", compiled) == "c xay c"
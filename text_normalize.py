@@ -0,0 +1,92 @@
+import json
+import os
+import re
+
+# Chuẩn hoá văn bản OCR: sửa các lỗi OCR thường gặp theo bảng thay thế rồi gộp
+# khoảng trắng (mỗi dòng một khoảng trắng giữa các từ, bỏ dòng trống). Kết quả
+# giống hệt clean_text cũ (các lệnh str.replace lần lượt theo thứ tự bảng, rồi
+# re.sub từng dòng), chỉ khác chỗ "năm 2xxx" được giữ nguyên có chủ ý.
+# Nhanh hơn vì chỉ replace khi khoá có trong văn bản và gộp khoảng trắng bằng
+# str.split thay cho re.sub trên từng dòng.
+#
+# Bảng sửa lỗi có thể bổ sung không cần sửa code: đặt file JSON {"sai": "đúng"}
+# tại OCR_CORRECTIONS_FILE (mặc định ocr_corrections.json nếu có).
+#
+# Chuẩn hoá hai lần không phải lúc nào cũng ra cùng kết quả (như clean_text cũ: gộp
+# khoảng trắng có thể tạo ra lỗi mới, ví dụ "120 m  2" -> "120 m 2"), nên kết quả được
+# đánh dấu NormalizedText và gọi lại normalize_text trên nó trả về ngay, không đổi.
+
+DEFAULT_CORRECTIONS = {
+    "m°": "m²",
+    "m 2": "m²",
+    "lôai": "loại",
+    "địạ": "địa",
+    "CCCD sô": "CCCD số",
+    "GCN:": "Giấy chứng nhận:",
+    # Các lỗi OCR phổ biến về ngày tháng
+    "<t": "1",                  # ví dụ <t3 -> 13
+    "t3": "13",                 # fallback nếu OCR bỏ mất dấu
+    "tháng .": "tháng ",
+    "năm²": "năm ",
+    "năm:": "năm ",
+    "tháng:": "tháng ",
+    "ngày:": "ngày ",
+    "²": "",                    # loại bỏ ký tự mũ (thường OCR nhầm)
+    # Giữ nguyên "năm 2xxx": trước đây quy tắc "m 2" biến "năm 2002" thành "năm 002"
+    "năm 2": "năm 2",
+}
+
+OCR_CORRECTIONS_FILE = os.environ.get("OCR_CORRECTIONS_FILE", "ocr_corrections.json")
+
+
+# Văn bản đã chuẩn hoá; gọi normalize_text lần nữa sẽ trả về ngay
+class NormalizedText(str):
+    pass
+
+
+def load_corrections(path=None):
+    corrections = dict(DEFAULT_CORRECTIONS)
+    path = path or OCR_CORRECTIONS_FILE
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            corrections.update(json.load(f))
+    return corrections
+
+
+# Biên dịch bảng sửa lỗi thành danh sách quy tắc (sai, đúng, pattern) theo đúng thứ
+# tự của bảng. Khoá thay bằng chính nó ("năm 2") là khoá bảo vệ: quy tắc có khoá nằm
+# trong khoá bảo vệ ("m 2") được chạy bằng regex bỏ qua các chỗ khớp khoá bảo vệ.
+def compile_corrections(corrections):
+    protected = [wrong for wrong, right in corrections.items() if wrong and wrong == right]
+    rules = []
+    for wrong, right in corrections.items():
+        if not wrong or wrong == right:
+            continue
+        guards = sorted((key for key in protected if wrong in key), key=len, reverse=True)
+        pattern = re.compile("|".join(re.escape(key) for key in guards + [wrong])) if guards else None
+        rules.append((wrong, right, pattern))
+    return rules
+
+
+_compiled = None
+
+
+def _default_normalizer():
+    global _compiled
+    if _compiled is None:
+        _compiled = compile_corrections(load_corrections())
+    return _compiled
+
+
+def normalize_text(text, compiled=None):
+    if isinstance(text, NormalizedText):
+        return text
+    for wrong, right, pattern in compiled or _default_normalizer():
+        if wrong not in text:
+            continue
+        if pattern is None:
+            text = text.replace(wrong, right)
+        else:
+            text = pattern.sub(lambda match: right if match.group() == wrong else match.group(), text)
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return NormalizedText("\n".join(line for line in lines if line))